@@ -4,11 +4,11 @@
 # lanceur : streamlit run app.py
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
 import folium
 import json as json
-import pydeck as pdk
+from pathlib import Path
 import numpy as np
+import os
 import branca.colormap as cm
 import plotly.io as pio
 import plotly.graph_objs as go
@@ -16,26 +16,152 @@ import matplotlib.pyplot as plt
 import plotly.express as px
 import plotly.graph_objects as go
 import ml_models as ml  # Module ML
+import data_store as store  # Dataset Parquet (SORTIE/parquet)
+import index_communes as idx  # Index code INSEE → lignes
+import couleurs  # Coloration vectorisée des cartes
+import geometries as geo  # Contours simplifiés par niveau de zoom
+import previsions as prev  # Prévisions du parc pour toutes les communes
+import precalcul  # Profils, tension et prévisions écrits dans le data store
+import cache  # Cache partagé entre processus / réplicas (Arrow IPC)
+import carte_deck  # Carte deck.gl : contours envoyés une fois, couleurs seules ensuite
+import instrumentation as instr  # Durées, hits / miss et tailles par exécution
 
 
 
 # Optimisation : Cache pour accélérer le chargement
-@st.cache_data
-def load_geojson(path):
-    gdf = gpd.read_file(path)
-    return gdf.set_crs(epsg=2154, allow_override=True).to_crs(epsg=4326)
+# Chaque chargeur est instrumenté (instrumentation.py) : durée, hit / miss et
+# taille du DataFrame retourné, par exécution de la page.
+# Les tables passent par le cache partagé (cache.py) : un fichier Arrow IPC par
+# résultat, lu en memory map par tous les réplicas, invalidé quand les sources changent.
+SOURCES_DONNEES = (store.RACINE_PARQUET,)
+SOURCES_GEO = (geo.DOSSIER_GEOMETRIES, geo.SOURCE_GEOJSON)
+
+# Contours pré-projetés en WGS84 (GeoParquet écrit par pipeline.py / geometries.py) :
+# ni parsing GeoJSON ni reprojection au démarrage. À défaut, lecture du GeoJSON source.
+@instr.instrumenter(cache.en_cache(sources=SOURCES_GEO))
+def load_geometries(niveau=geo.NIVEAU_REFERENCE):
+    gdf = geo.charger_niveau(niveau)
+    if gdf is None:
+        contours = geo.charger_contours()
+        gdf = contours.join(geo.metadonnees(contours)).to_crs(epsg=geo.CRS_CARTE)
+    return idx.trier_par_commune(gdf)
+
+
+# Vue d'ensemble (centre, zoom) tirée des métadonnées précalculées, sans union des polygones
+@instr.instrumenter(st.cache_data)
+def load_vue_globale():
+    return geo.vue_globale(load_geometries(geo.NIVEAU_REFERENCE))
+
+
+@instr.instrumenter(cache.en_cache(sources=SOURCES_DONNEES))
+def load_table(nom, colonnes=None, filtres=None):
+    # Projection + filtres poussés au Parquet : seules les partitions utiles sont lues
+    df = store.lire_table(nom, colonnes=colonnes, filtres=filtres)
+    return idx.trier_par_commune(df) if "insee_com" in df.columns else df
+
+
+# Carte : contours de référence + variables de l'année (jointure sur le code INSEE)
+@instr.instrumenter(cache.en_cache(sources=SOURCES_DONNEES + SOURCES_GEO))
+def load_carte(annee):
+    contours = load_geometries(geo.NIVEAU_REFERENCE)
+    donnees = load_table("communes", filtres={"AN": annee}).drop(columns="AN")
+    gdf = contours.merge(donnees, on="insee_com", how="left")
+    # Communes sans données : libellé et département du fichier des contours
+    gdf["LIBGEO"] = gdf["LIBGEO"].astype(object).fillna(gdf["nom"])
+    gdf["DEP"] = gdf["DEP"].astype(object).fillna(gdf["insee_dep"].astype(str).str.zfill(2))
+    return gdf
+
+
+# Prévisions de toutes les communes (table écrite par python previsions.py) ;
+# si elle n'existe pas encore, calcul vectorisé à partir de l'historique
+@instr.instrumenter(cache.en_cache(sources=SOURCES_DONNEES))
+def load_previsions():
+    if (Path(store.RACINE_PARQUET) / prev.TABLE_PREVISIONS).exists():
+        return load_table(prev.TABLE_PREVISIONS)
+    historique = load_table("communes", colonnes=["insee_com", "DEP", "AN", "LOG"])
+    previsions, _ = prev.prevoir(historique, n_workers=1)
+    return idx.trier_par_commune(previsions)
+
+
+@instr.instrumenter(st.cache_resource)
+def load_index_previsions(version):
+    return idx.construire_index(load_previsions(), nom="insee_com")
+
+
+# Erreurs de backtest de chaque famille de modèles, par commune (triées
+# par commune : les lignes d'une commune sont lues par l'index)
+@instr.instrumenter(cache.en_cache(sources=SOURCES_DONNEES))
+def load_erreurs_previsions():
+    if (Path(store.RACINE_PARQUET) / prev.TABLE_ERREURS).exists():
+        erreurs = store.lire_table(prev.TABLE_ERREURS, partitions=prev.PARTITIONS_ERREURS)
+    else:
+        historique = load_table("communes", colonnes=["insee_com", "DEP", "AN", "LOG"])
+        _, erreurs = prev.prevoir(historique, n_workers=1)
+    return idx.trier_par_commune(erreurs)
+
+
+@instr.instrumenter(st.cache_resource)
+def load_index_erreurs(version):
+    return idx.construire_index(load_erreurs_previsions(), nom="insee_com")
+
+
+# Profils de communes écrits par l'étape de précalcul ; à défaut, ajustement
+# (ou modèle du registre) sur la table de l'année. Objet partagé par toutes les
+# sessions, sans copie à chaque accès : à traiter en lecture seule.
+# `version` = empreinte des sources (profils relus quand le dataset change).
+@instr.instrumenter(st.cache_resource)
+def load_profils(annee, version=None):
+    resultat = precalcul.lire_profils(annee)
+    if resultat is None:
+        communes = load_table("communes", filtres={"AN": annee})
+        resultat = ml.identifier_profils_communes(communes, precalcul.K_PROFILS)
+    return resultat
+
+
+# Index partagés entre sessions (positions seulement, aucune copie de données) ;
+# `version` = empreinte des sources : un index est reconstruit quand les tables
+# servies par le cache partagé changent, il reste aligné sur leurs lignes
+@instr.instrumenter(st.cache_resource)
+def load_index_carte(annee, version):
+    return idx.construire_index(load_carte(annee))
+
 
+@instr.instrumenter(st.cache_resource)
+def load_index_table(nom, colonnes=None, filtres=None, version=None):
+    return idx.construire_index(load_table(nom, colonnes, filtres))
 
 
-@st.cache_data
-def load_csv(path):
-    return pd.read_csv(path)
+# Index des profils construit sur leur propre table (ordre et nombre de lignes
+# indépendants de la table communes chargée par l'application)
+@instr.instrumenter(st.cache_resource)
+def load_index_profils(annee, version=None):
+    return idx.construire_index(load_profils(annee, version)[0])
+
+
+# Couleurs de la carte : calculées une fois par (variable, schéma, palette),
+# partagées sans copie (lecture seule)
+@instr.instrumenter(st.cache_resource)
+def load_couleurs(annee, variable, schema="lineaire", palette="jaune_rouge", n_classes=5):
+    return couleurs.couleurs_rgba(
+        load_carte(annee)[variable], palette=palette, schema=schema, n_classes=n_classes
+    )
+
+
+# Contours d'un niveau de détail + libellé de l'infobulle, décodés une fois par
+# serveur (ordre des entités de la carte ; `version` = empreinte des sources)
+@instr.instrumenter(st.cache_resource)
+def load_contours_carte(niveau, version):
+    libelles = pd.DataFrame(load_carte(ANNEE_CARTE)[["insee_com", "LIBGEO"]]).rename(columns={"LIBGEO": "nom"})
+    return load_geometries(niveau)[geo.COLONNES_GEO].merge(libelles, on="insee_com", how="left")
 
 # ------------------------------------------------
 # ⚙️ CONFIGURATION
 # ------------------------------------------------
 st.set_page_config(page_title="Open Data Logement", layout="wide")
 
+# Début des mesures de cette exécution (une session = un identifiant stable)
+instr.debut_rerun()
+
 # Style CSS personnalisé 
 st.markdown(
     """
@@ -109,12 +235,20 @@ st.markdown(
 # ------------------------------------------------
 # IMPORT OPTIMISÉ DES DONNÉES avec cache
 # ------------------------------------------------
-gdf = load_geojson("DATA/communes_30_34_with_cc_2022.geojson")
-data_carto = load_csv("SORTIE/data_clean_2022.csv")
-datahab = load_csv("SORTIE/TAB_TYPEHAB.csv")
-datacate = load_csv("SORTIE/TAB_CATEHAB.csv")
-dataso = load_csv("SORTIE/RP_SO.csv")
-dataty = load_csv("SORTIE/RP_TYPO.csv")
+ANNEE_CARTE = 2022
+VERSION_DONNEES = cache.empreinte_sources(SOURCES_DONNEES + SOURCES_GEO)
+gdf = load_carte(ANNEE_CARTE)
+index_geo = load_index_carte(ANNEE_CARTE, VERSION_DONNEES)
+
+data_carto = load_table("communes", filtres={"AN": 2022})
+index_2022 = load_index_table("communes", filtres={"AN": 2022}, version=VERSION_DONNEES)
+
+# Historique commune × année réduit aux colonnes des graphiques de l'onglet Analyse
+COLONNES_HISTO = list(dict.fromkeys(
+    col for vue in ["TAB_TYPEHAB", "TAB_CATEHAB", "RP_SO", "RP_TYPO"] for col in store.colonnes_vue(vue)
+))
+histo = load_table("communes", colonnes=COLONNES_HISTO)
+index_histo = load_index_table("communes", colonnes=COLONNES_HISTO, version=VERSION_DONNEES)
 
 # ------------------------------------------------
 # EN-TÊTE DE L'APPLICATION
@@ -126,13 +260,30 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Création des onglets
-tab1, tab2, tab3, tab4 = st.tabs(["🛖Accueil", "🌍 Cartographie", "📈 Analyse", "🧠 Intelligence Territoriale"])
+# Navigation : seule la section choisie est exécutée à chaque interaction
+# (st.tabs exécute le contenu des quatre onglets à chaque rerun)
+SECTIONS = ["🛖Accueil", "🌍 Cartographie", "📈 Analyse", "🧠 Intelligence Territoriale"]
+section = st.radio("Section", SECTIONS, horizontal=True, key="section", label_visibility="collapsed")
+
+# Un widget non affiché pendant un rerun perd son état : on reporte celui des
+# sections masquées pour retrouver leurs choix quand on y revient (pas celui
+# de la section affichée, dont les widgets ont une valeur par défaut)
+WIDGETS_CONSERVES = {
+    "🌍 Cartographie": ["commune_carte", "radio_parc", "radio_rp", "radio_loc", "radio_schema", "select_niveau"],
+    "📈 Analyse": ["commune_analyse"],
+    "🧠 Intelligence Territoriale": ["recherche_profil", "commune_prediction", "annees_prediction"],
+}
+for section_masquee, cles_widgets in WIDGETS_CONSERVES.items():
+    if section_masquee == section:
+        continue
+    for cle_widget in cles_widgets:
+        if cle_widget in st.session_state:
+            st.session_state[cle_widget] = st.session_state[cle_widget]
 
 # ------------------------------------------------
 # ONGLET 1 : ACCUEIL
 # ------------------------------------------------
-with tab1:
+def afficher_accueil():
     # Titre principal
     st.markdown(
         "<h2 style='text-align:center; color:#8b5e3c;'>Projet open data et web des données</h2>",
@@ -218,7 +369,7 @@ with tab1:
 # ------------------------------------------------
 
 
-with tab2:
+def afficher_cartographie():
     # --- Préparation des données par département ---
     # Filtres département robustes (compatibles int/str)
     dep_str = data_carto['DEP'].astype(str)
@@ -229,6 +380,7 @@ with tab2:
     col1, col2, col3, col4, col5 = st.columns(5)
 
     # Fonction utilitaire pour créer une carte KPI
+    @instr.instrumenter(categorie="calcul")
     def kpi_card(title, col_name):
         dep_str = data_carto["DEP"].astype(str)
         total_34 = data_carto.loc[dep_str == "34", col_name].sum()
@@ -256,8 +408,8 @@ with tab2:
     # 🏘️ Lignes d'indicateurs
     # ------------------------------------------------
     with col1:
-        total_com_34 = data_carto[data_carto["DEP"] == 34]["insee_com"].nunique()
-        total_com_30 = data_carto[data_carto["DEP"] == 30]["insee_com"].nunique()
+        total_com_34 = data_carto[data_carto["DEP"] == "34"]["insee_com"].nunique()
+        total_com_30 = data_carto[data_carto["DEP"] == "30"]["insee_com"].nunique()
         html = f"""
         <div style='text-align:center; background-color:#f9e8d8; border-radius:12px; 
                     padding:10px 5px; box-shadow:0px 2px 4px rgba(0,0,0,0.1);'>
@@ -290,7 +442,15 @@ with tab2:
 
     st.markdown("---")
 
-# Layout : deux colonnes
+    panneau_carte()
+
+
+# Panneau de la carte (commune, variable, classification, détail, carte, légende) :
+# fragment, une interaction ne relance que ce panneau, sans recharger les tables
+# ni refaire les indicateurs
+@instr.fragment
+def panneau_carte():
+    # Layout : deux colonnes
 
     col_left, col_right = st.columns([3, 1], gap="small")
     with col_left:
@@ -302,13 +462,15 @@ with tab2:
         # --- NOUVEAU : Recherche de commune pour Zoom ---
         st.markdown("### Zoom sur une commune")
         
-        # Correction : On enlève les valeurs nulles (.dropna()) avant de trier
-        communes_propres = gdf["LIBGEO"].dropna().unique().tolist()
+        # Codes INSEE triés par nom (les homonymes restent distincts)
+        liste_communes = ["Aucune"] + idx.codes_tries(index_geo)
         
-        # On crée la liste finale
-        liste_communes = ["Aucune"] + sorted(communes_propres)
-        
-        selected_commune = st.selectbox("Sélectionnez pour mettre en évidence :", liste_communes)
+        selected_commune = st.selectbox(
+            "Sélectionnez pour mettre en évidence :",
+            liste_communes,
+            format_func=lambda code: code if code == "Aucune" else idx.libelle(index_geo, code),
+            key="commune_carte",
+        )
 
     # Layout : deux colonnes
     col_left, col_right = st.columns([1, 3], gap="small")
@@ -419,153 +581,93 @@ with tab2:
         elif st.session_state.selected_group == "loc" and choice_loc:
             variable = {v: k for k, v in labels_rpty.items()}[choice_loc]
 
+        # --- Classification des couleurs ---
+        st.markdown("###### 🎨 Classification")
+        labels_schema = {"lineaire": "Linéaire", "quantiles": "Quantiles", "jenks": "Seuils naturels (Jenks)"}
+        schema = st.radio(
+            "Classification",
+            options=couleurs.SCHEMAS,
+            format_func=labels_schema.get,
+            horizontal=True,
+            key="radio_schema",
+            label_visibility="collapsed",
+        )
+
+        # --- Niveau de détail des contours ---
+        st.markdown("###### 🔍 Détail des contours")
+        labels_niveau = {"auto": "Auto (selon le zoom)", "grossier": "Grossier", "moyen": "Moyen", "fin": "Fin"}
+        choix_niveau = st.selectbox(
+            "Détail des contours",
+            options=list(labels_niveau),
+            format_func=labels_niveau.get,
+            key="select_niveau",
+            label_visibility="collapsed",
+        )
+
             
 
     with col_right:
         # -----------------------------
-        # 1. Logique de Zoom & Centre (Conservée)
+        # 1. Logique de Zoom & Centre
         # -----------------------------
         
-        # Par défaut : Centre global
-        center = gdf.geometry.union_all().centroid
-        lat, lon = center.y, center.x
-        zoom_level = 8
+        # Par défaut : vue d'ensemble (centre et zoom précalculés)
+        vue = load_vue_globale()
         marker_data = None
         
-        # Si une commune est sélectionnée, on ajuste la vue et on prépare la surbrillance
+        # Si une commune est sélectionnée, on cadre la commune et on prépare la surbrillance
+        subset = None
         if selected_commune != "Aucune":
-            subset = gdf[gdf["LIBGEO"] == selected_commune]
+            subset = idx.lignes(gdf, index_geo, selected_commune)
             if not subset.empty:
-                centroid = subset.geometry.centroid.iloc[0]
-                lat, lon = centroid.y, centroid.x
+                vue = geo.vue_commune(subset.iloc[0])
                 
                 # Données pour le marqueur central
-                marker_data = pd.DataFrame([{
-                    "coordinates": [lon, lat],
-                    "text": selected_commune
-                }])
-
-        # -----------------------------
-        # 2. Préparation des Couleurs (Spécifique Pydeck)
-        # -----------------------------
-        
-        min_val = gdf[variable].min()
-        max_val = gdf[variable].max()
-        
-        def get_color_scale(val):
-            # --- CORRECTION : Gestion des valeurs manquantes (NaN) ---
-            if pd.isna(val): 
-                return [200, 200, 200] # Gris clair pour les données manquantes
-            
-            # Normalisation entre 0 et 1
-            if max_val == min_val: 
-                norm = 0
-            else: 
-                norm = (val - min_val) / (max_val - min_val)
-            
-            # Sécurité : On s'assure que norm est bien entre 0 et 1
-            norm = max(0, min(1, norm))
-            
-            # Interpolation simple : Jaune pale -> Rouge Foncé
-            r = int(255 - (norm * (255 - 180)))
-            g = int(255 - (norm * 255))
-            b = int(200 - (norm * 200))
-            return [r, g, b]
+                marker_data = {
+                    "coordinates": [vue["centre_lon"], vue["centre_lat"]],
+                    "text": idx.libelle(index_geo, selected_commune)
+                }
 
-        # On applique la couleur
-        gdf["fill_color"] = gdf[variable].apply(get_color_scale)
+        lat, lon, zoom_level = vue["centre_lat"], vue["centre_lon"], vue["zoom"]
 
         # -----------------------------
-        # 3. Configuration des Couches (Layers)
+        # 2. Préparation des Couleurs
         # -----------------------------
         
-        layers = []
-
-        # A. Couche Principale (Choropleth)
-        main_layer = pdk.Layer(
-            "GeoJsonLayer",
-            gdf,
-            pickable=True,       # Permet le survol (tooltip)
-            stroked=True,
-            filled=True,
-            extruded=False,      # Mettre à True pour la 3D
-            wireframe=True,
-            get_fill_color="fill_color", # On utilise la colonne calculée ci-dessus
-            get_line_color=[50, 50, 50],
-            get_line_width=70
-        )
-        layers.append(main_layer)
-
-        # B. Couche de Sélection (Contour noir épais)
-        if selected_commune != "Aucune":
-            highlight_geom = gdf[gdf["LIBGEO"] == selected_commune]
-            if not highlight_geom.empty:
-                highlight_layer = pdk.Layer(
-                    "GeoJsonLayer",
-                    data=highlight_geom,
-                    stroked=True,
-                    filled=False,
-                    get_line_color=[0, 0, 0, 255], # Noir opaque
-                    get_line_width=250, # Épaisseur en pixels
-                    line_width_units='pixels'
-                )
-                layers.append(highlight_layer)
-
-        # C. Couche Marqueur Central
-        if marker_data is not None:
-            marker_layer = pdk.Layer(
-                'TextLayer',
-                data=marker_data,
-                get_position='coordinates',
-                get_text='text',
-                get_color=[0, 0, 0, 200],
-                get_size=16,
-                get_alignment_baseline="'bottom'",
-            )
-            layers.append(marker_layer)
+        # Tableau RGBA calculé en NumPy et mis en cache (NaN → gris clair)
+        palette = "jaune_rouge"
+        fill_color, bornes = load_couleurs(ANNEE_CARTE, variable, schema, palette)
+
+        # Contours du niveau de détail adapté au zoom : envoyés au navigateur une
+        # fois par session, un changement de variable ou de classification ne
+        # transmet que les couleurs et les valeurs (cf. carte_deck.py)
+        niveau = geo.niveau_pour_zoom(zoom_level) if choix_niveau == "auto" else choix_niveau
+        contours = load_contours_carte(niveau, VERSION_DONNEES)
+        rgba = carte_deck.aligner(contours["insee_com"], gdf["insee_com"], fill_color, carte_deck.COULEUR_ABSENTE)
+        valeurs = carte_deck.aligner(contours["insee_com"], gdf["insee_com"], gdf[variable].to_numpy(dtype=float))
 
         # -----------------------------
-        # 4. Vue et Rendu
+        # 3. Rendu (contour de la commune choisie, marqueur, infobulle)
         # -----------------------------
-        
-        # Définition de la caméra
-        view_state = pdk.ViewState(
-            latitude=lat,
-            longitude=lon,
-            zoom=zoom_level,
-            pitch=0, # Mettre à 45 pour une vue inclinée 3D
-            bearing=0
-        )
-
-        # Tooltip (Infobulle au survol)
-        tooltip = {
-            "html": "<b>{LIBGEO} <br/>"
-                    f"{{{variable}}}%",
-            "style": {
-                "backgroundColor": "#faf6ef",
-                "color": "#8b5e3c",
-                "border": "1px solid #d17842",
-                "borderRadius": "5px"
-            }
-        }
-
-        # Affichage
-        r = pdk.Deck(
-            layers=layers,
-            initial_view_state=view_state,
-            map_style=None,
-            tooltip=tooltip
-        )
-        
-        
-        st.pydeck_chart(r, use_container_width=True,height=600)
+        surbrillance = subset[geo.COLONNES_GEO] if subset is not None and not subset.empty else None
+
+        with instr.mesure("Carte", "rendu"):
+            carte_deck.afficher(
+                contours, f"{niveau}:{VERSION_DONNEES[:12]}", rgba, valeurs,
+                cle="carte_cartographie",
+                vue={"centre_lon": lon, "centre_lat": lat, "zoom": zoom_level},
+                surbrillance=surbrillance,
+                marqueur=marker_data,
+                infobulle="<b>{nom}</b><br/>{valeur}%",
+                hauteur=600,
+            )
         # -----------------------------------------
         # LÉGENDE COULEUR (Compatible Streamlit)
         # -----------------------------------------
 
         # On récupère min et max (valeurs réelles)
-        min_val = float(gdf[variable].min())
-        max_val = float(gdf[variable].max())
+        min_val = float(bornes[0])
+        max_val = float(bornes[-1])
         mean_val = float(gdf[variable].mean())
 
         if max_val == min_val:
@@ -576,12 +678,28 @@ with tab2:
 
         mean_pct = mean_ratio * 100
 
+        if schema == "lineaire":
+            # Dégradé continu entre les couleurs d'ancrage de la palette
+            ancres = couleurs.PALETTES[palette]
+            fond = "linear-gradient(to right, " + ", ".join(f"rgb{tuple(c)}" for c in ancres) + ")"
+        else:
+            # Paliers : une couleur par classe, largeur proportionnelle à l'étendue
+            classes = couleurs.couleurs_classes(palette, len(bornes) - 1)
+            etendue = (max_val - min_val) or 1
+            arrets, debut = [], 0.0
+            for i, c in enumerate(classes):
+                fin = 100 if i == len(classes) - 1 else (bornes[i + 1] - min_val) / etendue * 100
+                arrets.append(f"rgb{tuple(int(x) for x in c)} {debut:.1f}% {fin:.1f}%")
+                debut = fin
+            fond = "linear-gradient(to right, " + ", ".join(arrets) + ")"
+            seuils = " · ".join(f"{v:.1f}" for v in bornes)
+
         legend_html = f"""
         <div>
             <div style="position:relative; height: 18px; margin-bottom: 12px;">
                 <div style="
                     height: 18px;
-                    background: linear-gradient(to right, rgb(255,255,180), rgb(255,0,0));
+                    background: {fond};
                     border-radius: 5px;
                 "></div>
                 <div style="
@@ -607,6 +725,8 @@ with tab2:
         """
 
         st.markdown(legend_html, unsafe_allow_html=True)
+        if schema != "lineaire":
+            st.caption(f"Seuils des classes : {seuils} %")
 
 
 
@@ -615,26 +735,33 @@ with tab2:
 # ------------------------------------------------
 # 📊 ONGLET 3 : ANALYSE
 # ------------------------------------------------
-with tab3:
+# Fragment : le choix d'une commune ne relance que cette section
+@instr.fragment
+def afficher_analyse():
     # =====================================================
     #  ANALYSE PAR COMMUNE — DESIGN ÉPURÉ ET HARMONISÉ
     # =====================================================
     st.markdown("<h2 style='text-align:center; color:#8b5e3c;'>Analyse par commune</h2>", unsafe_allow_html=True)
 
-    commune = st.selectbox(
+    code_commune = st.selectbox(
         "Sélectionnez une commune :",
-        sorted(datahab["LIBGEO"].unique()),
-        index=0
+        idx.codes_tries(index_histo),
+        index=0,
+        format_func=lambda code: idx.libelle(index_histo, code),
+        key="commune_analyse",
     )
+    commune = idx.libelle(index_histo, code_commune)
+    lignes_commune = idx.lignes(histo, index_histo, code_commune)
+    lignes_commune_2022 = lignes_commune[lignes_commune["AN"] == 2022]
     
     # Récupération du département correspondant à la commune sélectionnée
-    dep_value = gdf.loc[gdf["LIBGEO"] == commune, "DEP"].iloc[0]
+    dep_value = index_histo["deps"].get(code_commune)
 
 
     # Attribution du nom du département
-    if dep_value == 34:
+    if dep_value == "34":
         departement = "Hérault"
-    elif dep_value == 30:
+    elif dep_value == "30":
         departement = "Gard"
     else:
         departement = "Autre département"
@@ -642,14 +769,14 @@ with tab3:
     st.markdown("---")
 
     # Palette de couleurs beige-orange harmonisée
-    couleurs = ["#d17842", "#e8a87c", "#8b5e3c", "#f0b68c", "#c06838"]
+    palette = ["#d17842", "#e8a87c", "#8b5e3c", "#f0b68c", "#c06838"]
 
     # =====================================================
     # 1️⃣ Évolution du parc de logements
     # =====================================================
     col1, col2 = st.columns(2, gap="medium")
     with col1:
-        datahab2 = datahab[datahab["LIBGEO"] == commune]
+        datahab2 = store.fondre_vue(lignes_commune, "TAB_TYPEHAB")
 
         fig = px.bar(
             datahab2,
@@ -659,7 +786,7 @@ with tab3:
             color="TYPE_HABITAT",
             text_auto=True,
             title="<b>Évolution du parc de 2013 à 2022 selon le type d'habitat</b>",
-            color_discrete_sequence=couleurs[:2],
+            color_discrete_sequence=palette[:2],
             labels={
                 "AN": "Année",
                 "NOMBRE": "Nombre de logements",
@@ -701,14 +828,14 @@ with tab3:
     # 2️⃣ Répartition des résidences principales (camembert)
     # =====================================================
     with col2:
-        dataso2 = dataso[(dataso["LIBGEO"] == commune) & (dataso["AN"] == 2022)]
+        dataso2 = store.fondre_vue(lignes_commune_2022, "RP_SO")
 
         fig2 = px.pie(
             dataso2,
             values="NOMBRE",
             names="STATUT",
             title="<b>Répartition des résidences principales en 2022 par statut d'occupation</b>",
-            color_discrete_sequence=couleurs
+            color_discrete_sequence=palette
         )
         fig2.update_traces(textinfo="percent+label", pull=[0.05, 0.05, 0.05, 0.05])
         fig2.update_layout(
@@ -727,7 +854,7 @@ with tab3:
     # =====================================================
     col3, col4 = st.columns(2, gap="medium")
     with col3:
-        datacate2 = datacate[datacate["LIBGEO"] == commune]
+        datacate2 = store.fondre_vue(lignes_commune, "TAB_CATEHAB")
 
         fig3 = px.area(
             datacate2,
@@ -735,7 +862,7 @@ with tab3:
             y="NOMBRE",
             color="TYPE_LOG",
             title="<b>Évolution des logements de 2013 à 2022 selon leur catégorie</b>",
-            color_discrete_sequence=couleurs[:3],
+            color_discrete_sequence=palette[:3],
             labels={
                 "AN": "Année",
                 "NOMBRE": "Nombre de logements",
@@ -756,7 +883,7 @@ with tab3:
     # 4️⃣ Typologie des résidences principales
     # =====================================================
     with col4:
-        dataty2 = dataty[(dataty["LIBGEO"] == commune) & (dataty["AN"] == 2022)]
+        dataty2 = store.fondre_vue(lignes_commune_2022, "RP_TYPO")
 
         fig4 = px.bar(
             dataty2,
@@ -778,31 +905,12 @@ with tab3:
 # ------------------------------------------------
 # ONGLET 4 : INTELLIGENCE TERRITORIALE
 # ------------------------------------------------
-with tab4:
+def afficher_intelligence():
 
     st.markdown("<h2 style='text-align:center; color:#8b5e3c;'>Intelligence Territoriale</h2>", unsafe_allow_html=True)
     st.markdown("<p style='text-align:center; color:#8b5e3c; font-size:16px;'>Analyses avancées et aide à la décision</p>", unsafe_allow_html=True)
     st.markdown("---")
 
-    # 🔧 CREATION AUTOMATIQUE DES VARIABLES MANQUANTES POUR LE ML
-    if "Plog_MAISON" not in data_carto.columns:
-        data_carto["Plog_MAISON"] = (data_carto["MAISON"] / data_carto["LOG"]) * 100
-
-    if "Plog_APPART" not in data_carto.columns:
-        data_carto["Plog_APPART"] = (data_carto["APPART"] / data_carto["LOG"]) * 100
-
-    if "Plog_RP" not in data_carto.columns:
-        data_carto["Plog_RP"] = (data_carto["RP"] / data_carto["LOG"]) * 100
-
-    if "Plog_RS" not in data_carto.columns:
-        data_carto["Plog_RS"] = (data_carto["RSECOCC"] / data_carto["LOG"]) * 100
-
-    if "Plog_VAC" not in data_carto.columns:
-        data_carto["Plog_VAC"] = (data_carto["LOGVAC"] / data_carto["LOG"]) * 100
-
-    if "Prp_RP_PROP" not in data_carto.columns:
-        data_carto["Prp_RP_PROP"] = (data_carto["RP_PROP"] / data_carto["RP"]) * 100
-
     # -------------------------------------------------
     # SOUS-ONGLETS
     ia_tab1, ia_tab2 = st.tabs([
@@ -814,30 +922,33 @@ with tab4:
     # =====================================================
     # 1️⃣ PROFILS DE COMMUNES (Clustering K-Means)
     # =====================================================
-    with ia_tab1:
+    with ia_tab1, instr.mesure("Profils", "onglet"):
 
         st.markdown("### Regrouper les communes similaires")
         st.markdown("<div class='info-card'><p style='color:#8b5e3c;margin:0;'>Regroupement automatique des communes aux profils proches (vacance, propriétaires, résidences secondaires).</p></div>", unsafe_allow_html=True)
 
-        # → On fixe K=3
-        n_profils = 3
-        data_profils, noms_profils = ml.identifier_profils_communes(data_carto, n_profils)
+        # Profils précalculés (python precalcul.py ou pipeline.py) : simple lecture
+        data_profils, noms_profils = load_profils(ANNEE_CARTE, VERSION_DONNEES)
+        index_profils = load_index_profils(ANNEE_CARTE, VERSION_DONNEES)
 
         col_profils, col_map = st.columns([1, 2], gap="large")
 
         with col_profils:
-            st.markdown("#### Groupes identifiés (3)")
+            st.markdown(f"#### Groupes identifiés ({len(noms_profils)})")
+
+            # Effectifs et moyennes de tous les profils en une agrégation
+            resume_profils = ml.resumer_profils(data_profils)
 
             for profil_id, info in noms_profils.items():
-                subset = data_profils[data_profils['Profil'] == profil_id]
+                stats_profil = resume_profils.loc[profil_id]
 
-                pct_vac = subset["Plog_VAC"].mean()
-                pct_rs = subset["Plog_RS"].mean()
+                pct_vac = stats_profil["Plog_VAC"]
+                pct_rs = stats_profil["Plog_RS"]
 
                 st.markdown(f"""
                 <div class='info-card'>
                     <h4 style='color:#d17842; margin-top:0;'>{info['nom']}</h4>
-                    <p style='color:#8b5e3c; margin:5px 0;'><b>{len(subset)} communes</b></p>
+                    <p style='color:#8b5e3c; margin:5px 0;'><b>{int(stats_profil['effectif'])} communes</b></p>
                     <p style='color:#8b5e3c; margin:0; font-size:12px;'>
                         Vacance moyenne : {pct_vac:.1f}%<br>
                         Rés. secondaires moyenne : {pct_rs:.1f}%
@@ -851,127 +962,7 @@ with tab4:
 
 
         with col_map:
-            st.markdown("#### Cartographie des profils identifiés")
-            st.markdown("##### Trouver le profil d'une commune")
-            commune_recherche = st.selectbox(
-                "Sélectionnez une commune",
-                sorted(data_profils["LIBGEO"].unique()),
-                key="recherche_profil"
-            )
-
-            if commune_recherche:
-                profil_commune = data_profils[data_profils['LIBGEO'] == commune_recherche]['Profil'].iloc[0]
-                nom_profil = noms_profils[profil_commune]['nom']
-
-                communes_similaires = data_profils[data_profils["Profil"] == profil_commune][["LIBGEO", "DEP"]].sort_values("LIBGEO")
-
-                st.info(f"**{commune_recherche}** appartient au groupe : **{nom_profil}**")
-
-            gdf_profils = gdf.merge(
-                data_profils[["LIBGEO", "Profil", "Nom_Profil"]],
-                on="LIBGEO",
-                how="left",
-            )
-
-            highlight_geom = None
-            if commune_recherche:
-                highlight_geom = gdf_profils[gdf_profils["LIBGEO"] == commune_recherche]
-                if highlight_geom.empty:
-                    highlight_geom = None
-
-            color_palette = [
-                [209, 120, 66],
-                [139, 94, 60],
-                [247, 197, 142],
-                [120, 158, 149],
-                [183, 120, 180],
-            ]
-            profil_colors = {
-                profil_id: color_palette[idx % len(color_palette)]
-                for idx, profil_id in enumerate(sorted(noms_profils.keys()))
-            }
-
-            gdf_profils["fill_color"] = gdf_profils["Profil"].map(
-                lambda x: profil_colors.get(x, [210, 210, 210])
-            )
-
-            center_geom = gdf.geometry.union_all().centroid
-            profils_view = pdk.ViewState(
-                latitude=center_geom.y,
-                longitude=center_geom.x,
-                zoom=8,
-                pitch=0,
-            )
-
-            profils_layer = pdk.Layer(
-                "GeoJsonLayer",
-                gdf_profils,
-                pickable=True,
-                stroked=True,
-                filled=True,
-                get_fill_color="fill_color",
-                get_line_color=[80, 80, 80],
-                get_line_width=50,
-            )
-
-            layers = [profils_layer]
-
-            if highlight_geom is not None:
-                highlight_layer = pdk.Layer(
-                    "GeoJsonLayer",
-                    highlight_geom,
-                    stroked=True,
-                    filled=False,
-                    get_line_color=[0, 0, 0],
-                    get_line_width=300,
-                    get_line_width_min_pixels=3,
-                )
-                layers.append(highlight_layer)
-
-            profils_tooltip = {
-                "html": "<b>{LIBGEO}</b><br/>Profil : {Nom_Profil}",
-                "style": {
-                    "backgroundColor": "#faf6ef",
-                    "color": "#8b5e3c",
-                    "border": "1px solid #d17842",
-                    "borderRadius": "5px",
-                },
-            }
-
-            profils_map = pdk.Deck(
-                layers=layers,
-                initial_view_state=profils_view,
-                map_style=None,
-                tooltip=profils_tooltip,
-            )
-
-            st.pydeck_chart(profils_map, use_container_width=True, height=500)
-
-            legend_blocks = []
-            for profil_id, info in noms_profils.items():
-                color = profil_colors.get(profil_id, [210, 210, 210])
-                nom = info["nom"].strip()
-                if nom.lower().startswith("profil "):
-                    nom = nom.split(" ", 1)[1]
-                block = (
-                    f"<div style='display:flex; align-items:center; margin-bottom:6px;'>"
-                    f"<span style='width:16px; height:16px; border-radius:4px; background: rgb({color[0]}, {color[1]}, {color[2]}); display:inline-block; margin-right:8px; border:1px solid #8b5e3c;'></span>"
-                    f"<span style='color:#8b5e3c; font-size:13px;'>Profil {nom}</span>"
-                    f"</div>"
-                )
-                legend_blocks.append(block)
-
-            legend_items = "".join(legend_blocks)
-
-            st.markdown(
-                f"""
-                <div style='background:#faf6ef; padding:12px 16px; border-radius:10px; box-shadow:0 4px 12px rgba(139,94,60,0.12); margin-bottom:20px;'>
-                    <h5 style='color:#d17842; margin-top:0;'>Légende des profils</h5>
-                    {legend_items}
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
+            carte_profils(data_profils, noms_profils, index_profils)
 
 
 
@@ -984,20 +975,28 @@ with tab4:
     # =====================================================
     # 3️⃣ PRÉDICTION : Evolution du nombre de logements
     # =====================================================
-    with ia_tab2:
+    with ia_tab2, instr.mesure("Prévisions", "onglet"):
 
         st.markdown("### Prédiction du parc de logements")
         st.markdown("<div class='info-card'><p style='color:#8b5e3c;margin:0;'>Projection simple basée sur la tendance historique.</p></div>", unsafe_allow_html=True)
 
         col1, col2 = st.columns([3, 1])
         with col1:
-            commune_pred = st.selectbox("Sélectionnez une commune", sorted(datahab["LIBGEO"].unique()))
+            code_pred = st.selectbox(
+                "Sélectionnez une commune",
+                idx.codes_tries(index_histo),
+                format_func=lambda code: idx.libelle(index_histo, code),
+                key="commune_prediction",
+            )
         with col2:
-            annees_pred = st.slider("Années à prédire", 1, 5, 3)
+            annees_pred = st.slider("Années à prédire", 1, 5, 3, key="annees_prediction")
 
         if st.button("Lancer la prédiction", type="primary"):
 
-            predictions, croissance = ml.predire_evolution_logements(datahab, commune_pred, annees_pred)
+            # Simple lecture : les prévisions de toutes les communes sont précalculées
+            historique = idx.lignes(histo, index_histo, code_pred)[["AN", "LOG"]]
+            previsions_commune = idx.lignes(load_previsions(), load_index_previsions(VERSION_DONNEES), code_pred)
+            predictions, croissance = prev.serie_commune(historique, previsions_commune, annees_pred)
 
             if predictions is not None:
                 st.success("Prédiction réalisée")
@@ -1011,6 +1010,19 @@ with tab4:
                 with col2: st.metric(f"Prévision {annee_fin}", f"{int(dernier_pred):,}".replace(",", " "))
                 with col3: st.metric("Évolution", f"{int(dernier_pred - dernier_reel):+}", delta=f"{croissance:.2f}%/an")
 
+                modele = previsions_commune["MODELE"].iloc[0]
+                st.caption(
+                    f"Modèle retenu : {modele} — erreur moyenne en backtest : "
+                    f"{previsions_commune['RMSE'].iloc[0]:.0f} logements ({previsions_commune['MAPE'].iloc[0]:.1f} %)"
+                )
+
+                with st.expander("Comparaison des modèles (backtest)"):
+                    erreurs = idx.lignes(load_erreurs_previsions(), load_index_erreurs(VERSION_DONNEES), code_pred)
+                    st.dataframe(
+                        erreurs[["MODELE", "RMSE", "MAE", "MAPE", "N_TESTS", "RETENU"]].sort_values("RMSE"),
+                        hide_index=True, width='stretch',
+                    )
+
                 fig = px.line(predictions, x="Année", y="Logements", color="Type", markers=True)
                 fig.update_layout(template="plotly_white")
                 st.plotly_chart(fig, use_container_width=True)
@@ -1028,3 +1040,124 @@ with tab4:
         Les modèles utilisent des tendances historiques et doivent être interprétés avec prudence.
     </div>
     """, unsafe_allow_html=True)
+
+
+# Recherche d'une commune et carte des profils : fragment, le choix d'une
+# commune ne relance que ce bloc
+@instr.fragment
+def carte_profils(data_profils, noms_profils, index_profils):
+    st.markdown("#### Cartographie des profils identifiés")
+    st.markdown("##### Trouver le profil d'une commune")
+    commune_recherche = st.selectbox(
+        "Sélectionnez une commune",
+        idx.codes_tries(index_profils),
+        format_func=lambda code: idx.libelle(index_profils, code),
+        key="recherche_profil"
+    )
+
+    if commune_recherche:
+        profil_commune = idx.lignes(data_profils, index_profils, commune_recherche)['Profil'].iloc[0]
+        nom_profil = noms_profils[profil_commune]['nom']
+
+        communes_similaires = data_profils[data_profils["Profil"] == profil_commune][["LIBGEO", "DEP"]].sort_values("LIBGEO")
+
+        st.info(f"**{idx.libelle(index_profils, commune_recherche)}** appartient au groupe : **{nom_profil}**")
+
+    # Contours simplifiés du zoom de la vue (mêmes contours que la carte de la
+    # cartographie) ; seuls les codes de profil et leurs couleurs sont envoyés
+    vue_profils = load_vue_globale()
+    niveau_profils = geo.niveau_pour_zoom(vue_profils["zoom"])
+    contours = load_contours_carte(niveau_profils, VERSION_DONNEES)
+    profils = carte_deck.aligner(contours["insee_com"], data_profils["insee_com"],
+                                 data_profils["Profil"].to_numpy(dtype=float))
+
+    surbrillance = None
+    if commune_recherche:
+        surbrillance = idx.lignes(gdf, index_geo, commune_recherche)[geo.COLONNES_GEO]
+        if surbrillance.empty:
+            surbrillance = None
+
+    color_palette = [
+        [209, 120, 66],
+        [139, 94, 60],
+        [247, 197, 142],
+        [120, 158, 149],
+        [183, 120, 180],
+    ]
+    profil_colors = {
+        profil_id: color_palette[idx % len(color_palette)]
+        for idx, profil_id in enumerate(sorted(noms_profils.keys()))
+    }
+
+    # Table de correspondance code de profil → RGBA (communes sans profil en gris)
+    table_couleurs = np.array([profil_colors.get(p, [210, 210, 210]) + [255] for p in range(max(noms_profils) + 1)],
+                              dtype=np.uint8)
+    rgba = np.full((len(profils), 4), carte_deck.COULEUR_ABSENTE, dtype=np.uint8)
+    connus = ~np.isnan(profils)
+    rgba[connus] = table_couleurs[profils[connus].astype(int)]
+
+    with instr.mesure("Carte des profils", "rendu"):
+        carte_deck.afficher(
+            contours, f"{niveau_profils}:{VERSION_DONNEES[:12]}", rgba, profils,
+            cle="carte_profils",
+            vue=vue_profils,
+            surbrillance=surbrillance,
+            infobulle="<b>{nom}</b><br/>Profil : {classe}",
+            classes={str(profil_id): info["nom"] for profil_id, info in noms_profils.items()},
+            hauteur=500,
+            ligne={"couleur": [80, 80, 80], "epaisseur": 50},
+        )
+
+    legend_blocks = []
+    for profil_id, info in noms_profils.items():
+        color = profil_colors.get(profil_id, [210, 210, 210])
+        nom = info["nom"].strip()
+        if nom.lower().startswith("profil "):
+            nom = nom.split(" ", 1)[1]
+        block = (
+            f"<div style='display:flex; align-items:center; margin-bottom:6px;'>"
+            f"<span style='width:16px; height:16px; border-radius:4px; background: rgb({color[0]}, {color[1]}, {color[2]}); display:inline-block; margin-right:8px; border:1px solid #8b5e3c;'></span>"
+            f"<span style='color:#8b5e3c; font-size:13px;'>Profil {nom}</span>"
+            f"</div>"
+        )
+        legend_blocks.append(block)
+
+    legend_items = "".join(legend_blocks)
+
+    st.markdown(
+        f"""
+        <div style='background:#faf6ef; padding:12px 16px; border-radius:10px; box-shadow:0 4px 12px rgba(139,94,60,0.12); margin-bottom:20px;'>
+            <h5 style='color:#d17842; margin-top:0;'>Légende des profils</h5>
+            {legend_items}
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+# ------------------------------------------------
+# 🧭 SECTION ACTIVE
+# ------------------------------------------------
+AFFICHAGES = dict(zip(SECTIONS, [afficher_accueil, afficher_cartographie, afficher_analyse, afficher_intelligence]))
+with instr.mesure(section, "onglet"):
+    AFFICHAGES[section]()
+
+
+# ------------------------------------------------
+# ⏱️ MESURES DE L'EXÉCUTION (panneau de debug + journal)
+# ------------------------------------------------
+# Panneau affiché avec ?debug=1 dans l'URL ou OPENDATA_DEBUG=1 ; le journal
+# (instrumentation.JOURNAL) reçoit une ligne par exécution dans tous les cas.
+bilan = instr.fin_rerun()
+if st.query_params.get("debug") == "1" or os.environ.get("OPENDATA_DEBUG") == "1":
+    with st.sidebar:
+        st.markdown("### ⏱️ Mesures de l'exécution")
+        st.caption(f"Session {bilan['session']} · exécution n°{bilan['rerun']} · "
+                   f"{bilan['secondes']:.2f} s · pic RSS {bilan['pic_rss_mo'] or 0:.0f} Mo")
+        mesures = pd.DataFrame(bilan["mesures"])
+        if not mesures.empty:
+            # Indentation selon l'imbrication (chargeur appelé par un autre, carte dans un onglet...)
+            mesures["nom"] = ["  " * niveau + nom for niveau, nom in zip(mesures["niveau"], mesures["nom"])]
+            st.dataframe(mesures.drop(columns="niveau"), hide_index=True, width='stretch')
+        st.markdown("**Cache partagé (processus)**")
+        st.json(cache.etat(), expanded=False)
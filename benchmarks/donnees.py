@@ -0,0 +1,186 @@
+# ================================================================
+# 🧪 DONNÉES SYNTHÉTIQUES — Tables communes × années et contours
+# ================================================================
+# Ce module regroupe :
+# 1. Classeurs annuels fictifs au format INSEE (mêmes variables que
+#    la table communes), compilés par pipeline.compiler_bases
+# 2. Contours fictifs : grille de communes jointives aux frontières
+#    bruitées (GeoJSON Lambert 93, comme la source IGN)
+# 3. Écriture d'un jeu complet (dataset Parquet + GeoJSON) à une échelle donnée
+# ================================================================
+# Reproductible : même graine → mêmes tables et mêmes contours.
+
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import data_store as store
+import geometries as geo
+import pipeline
+
+
+# Nombre de lignes commune × année de chaque échelle (10 millésimes)
+ECHELLES = {"petite": 1_000, "moyenne": 35_000, "france": 350_000}
+ANNEES = list(range(2013, 2023))
+
+COTE_COMMUNE = 4_000   # mètres (≈ 16 km², surface moyenne d'une commune)
+POINTS_PAR_COTE = 12   # sommets intermédiaires de chaque frontière
+
+
+# =================================================================
+# 🔵 1) TABLES COMMUNES × ANNÉES
+# =================================================================
+
+def colonnes_brutes(racine=store.RACINE_PARQUET):
+    """
+    Variables brutes de la table communes du dataset (schéma réel) ; à
+    défaut de dataset, les variables utilisées par l'application.
+    """
+    chemin = Path(racine) / store.TABLE_COMMUNES
+    if chemin.exists():
+        noms = store.ouvrir_dataset(store.TABLE_COMMUNES, racine).schema.names
+        return [nom for nom in noms[:noms.index("RP_LOCPRIV")] if nom not in ("insee_com", "REG", "LIBGEO")]
+    return ["LOG", "RP", "RSECOCC", "LOGVAC", "MAISON", "APPART", "RP_1P", "RP_2P", "RP_3P", "RP_4P",
+            "RP_5PP", "RP_PROP", "RP_LOC", "RP_LOCHLMV", "RP_GRAT", "RP_ACH19", "RP_ACH45", "RP_ACH70",
+            "RP_ACH90", "RP_ACH05", "RP_ACH18"]
+
+
+def _repartir(total, parts):
+    """Répartit `total` (n,) selon les proportions `parts` (n, k) en entiers."""
+    return np.rint(total[:, None] * parts / parts.sum(axis=1, keepdims=True))
+
+
+def generer_bases(n_communes, annees=ANNEES, colonnes=None, graine=0):
+    """
+    {année: DataFrame} au format des classeurs filtrés par le pipeline
+    (CODGEO, REG, DEP, LIBGEO, variables, AN) pour `n_communes` communes.
+    Parc initial log-normal, croissance annuelle propre à chaque commune.
+    """
+    rng = np.random.default_rng(graine)
+    colonnes = colonnes or colonnes_brutes()
+
+    n_dep = min(99, max(1, n_communes // 360))   # ~ 360 communes par département
+    deps = np.array([f"{d:02d}" for d in np.arange(n_communes) % n_dep + 1])
+    codes = np.array([f"{dep}{rang:03d}" for dep, rang in zip(deps, np.arange(n_communes) // n_dep)])
+    noms = np.array([f"Commune {code}" for code in codes])
+
+    parc_initial = rng.lognormal(np.log(490), 1.3, n_communes)
+    croissance = rng.normal(0.01, 0.01, n_communes)
+    parts_type = rng.dirichlet([8, 2, 1], n_communes)        # RP / RS / vacants
+    parts_forme = rng.dirichlet([3, 1], n_communes)          # maisons / appartements
+    parts_statut = rng.dirichlet([6, 3, 1.5, 0.3], n_communes)  # prop. / loc. privé / HLM / gratuit
+    parts_autres = rng.uniform(0.05, 0.9, (n_communes, len(colonnes)))
+
+    bases = {}
+    for rang, annee in enumerate(annees):
+        bruit = rng.normal(0, 0.01, n_communes)
+        log = np.rint(parc_initial * (1 + croissance) ** rang * (1 + bruit)).clip(1)
+        rp, rs, vac = _repartir(log, parts_type).T
+        maison, appart = _repartir(log, parts_forme).T
+        prop, locpriv, hlm, grat = _repartir(rp, parts_statut).T
+
+        valeurs = {col: np.rint(rp * parts_autres[:, i]) for i, col in enumerate(colonnes)}
+        valeurs.update({
+            "LOG": log, "RP": rp, "RSECOCC": rs, "LOGVAC": vac, "MAISON": maison, "APPART": appart,
+            "RP_PROP": prop, "RP_LOC": locpriv + hlm, "RP_LOCHLMV": hlm, "RP_GRAT": grat, "MEN": rp,
+        })
+        df = pd.DataFrame({"CODGEO": codes, "REG": "76", "DEP": deps, "LIBGEO": noms})
+        df = pd.concat([df, pd.DataFrame({col: valeurs[col] for col in colonnes})], axis=1)
+        df["AN"] = annee
+        bases[annee] = df
+
+    return bases
+
+
+def generer_table(n_lignes, annees=ANNEES, graine=0):
+    """Table communes (schéma du dataset) d'environ `n_lignes` lignes commune × année."""
+    n_communes = max(1, n_lignes // len(annees))
+    bases = generer_bases(n_communes, annees, graine=graine)
+    return pipeline.compiler_bases(bases).rename(columns={"CODGEO": "insee_com"})
+
+
+# =================================================================
+# 🔵 2) CONTOURS
+# =================================================================
+
+def _frontieres(n_x, n_y, orientation, rng, amplitude):
+    """
+    Sommets intermédiaires bruités de chaque frontière de la grille :
+    tableau (n_x, n_y, POINTS_PAR_COTE, 2), partagé par les deux communes voisines.
+    """
+    t = np.linspace(0, 1, POINTS_PAR_COTE + 2)[1:-1]
+    i, j = np.meshgrid(np.arange(n_x), np.arange(n_y), indexing="ij")
+    le_long = (i[..., None] + t) if orientation == "h" else np.broadcast_to(i[..., None], (n_x, n_y, len(t)))
+    travers = np.broadcast_to(j[..., None], le_long.shape) if orientation == "h" else (j[..., None] + t)
+    # Bruit perpendiculaire nul aux extrémités (les nœuds de la grille restent fixes)
+    bruit = rng.uniform(-amplitude, amplitude, le_long.shape) * np.sin(np.pi * t)
+    if orientation == "h":
+        return np.stack([le_long, travers + bruit], axis=-1)
+    return np.stack([le_long + bruit, travers], axis=-1)
+
+
+def generer_contours(codes, deps, noms, graine=0, origine=(600_000, 6_200_000)):
+    """
+    GeoDataFrame Lambert 93 (insee_com, nom, insee_dep, geometry) : grille de
+    communes carrées aux frontières bruitées, sans trou ni chevauchement.
+    """
+    rng = np.random.default_rng(graine)
+    n = len(codes)
+    n_x = int(np.ceil(np.sqrt(n)))
+    n_y = int(np.ceil(n / n_x))
+
+    horizontales = _frontieres(n_x, n_y + 1, "h", rng, 0.08)
+    verticales = _frontieres(n_x + 1, n_y, "v", rng, 0.08)
+
+    i, j = np.divmod(np.arange(n), n_y)
+
+    def noeud(di, dj):
+        return np.stack([i + di, j + dj], axis=-1)[:, None, :].astype(float)
+
+    anneaux = np.concatenate([
+        noeud(0, 0), horizontales[i, j],
+        noeud(1, 0), verticales[i + 1, j],
+        noeud(1, 1), horizontales[i, j + 1][:, ::-1],
+        noeud(0, 1), verticales[i, j][:, ::-1],
+        noeud(0, 0),
+    ], axis=1)
+    anneaux = anneaux * COTE_COMMUNE + np.asarray(origine, dtype=float)
+
+    return gpd.GeoDataFrame(
+        {"insee_com": codes, "nom": noms, "insee_dep": deps},
+        geometry=shapely.polygons(anneaux),
+        crs=f"EPSG:{geo.CRS_SOURCE}",
+    )
+
+
+# =================================================================
+# 🔵 3) JEU COMPLET
+# =================================================================
+
+def ecrire_jeu(dossier, n_lignes, graine=0, contours=True):
+    """
+    Écrit dans `dossier` : parquet/communes (dataset du data store) et
+    communes.geojson. Retourne (racine du dataset, chemin du GeoJSON ou None).
+    """
+    dossier = Path(dossier)
+    racine = dossier / "parquet"
+    table = generer_table(n_lignes, graine=graine)
+    store.ecrire_table(table, store.TABLE_COMMUNES, racine=racine)
+
+    source = None
+    if contours:
+        communes = table.drop_duplicates("insee_com")
+        gdf = generer_contours(communes["insee_com"].to_numpy(), communes["DEP"].to_numpy(),
+                               communes["LIBGEO"].to_numpy(), graine)
+        source = dossier / "communes.geojson"
+        gdf.to_file(source, driver="GeoJSON")
+
+    (dossier / "jeu.json").write_text(
+        json.dumps({"lignes": len(table), "communes": int(table["insee_com"].nunique()), "graine": graine}),
+        encoding="utf-8",
+    )
+    return racine, source
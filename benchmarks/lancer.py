@@ -0,0 +1,229 @@
+# ================================================================
+# ⏱️ BENCHMARKS — Étapes principales sur données synthétiques
+# ================================================================
+# Ce module regroupe :
+# 1. Mesure d'une étape : temps (meilleur de n répétitions) et hausse du
+#    pic RSS (passe séparée dans un processus fils, pour ne pas fausser le
+#    temps et compter aussi les tampons Arrow / NumPy hors de tracemalloc)
+# 2. Étapes : lecture table / contours, construction des contours,
+#    coloration, profils, tension, prévisions
+# 3. Résultats JSON et comparaison à une référence enregistrée
+# ================================================================
+# lanceur : python -m benchmarks.lancer --echelles petite moyenne
+#           python -m benchmarks.lancer --echelles petite --sauver-reference
+# Code de sortie 1 si une étape dépasse la référence de plus de --tolerance.
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import couleurs
+import data_store as store
+import geometries as geo
+import instrumentation as instr
+import ml_models as ml
+import previsions as prev
+from benchmarks import donnees
+
+
+FICHIER_REFERENCE = Path(__file__).with_name("reference.json")
+DOSSIER_RESULTATS = "SORTIE/benchmarks"
+
+TOLERANCE = 1.5   # ratio temps mesuré / référence au-delà duquel une étape régresse
+PLANCHER = 0.05   # secondes : en dessous, le bruit de mesure domine, pas de comparaison
+
+
+# =================================================================
+# 🔵 1) MESURE
+# =================================================================
+
+def _hausse_pic(fonction, connexion):
+    """Dans le processus fils : hausse du pic RSS pendant fonction() (Mo)."""
+    avant = instr.pic_rss_mo()
+    fonction()
+    connexion.send(instr.pic_rss_mo() - avant)
+
+
+def _pic_rss(fonction):
+    """
+    Hausse du pic RSS d'un appel de fonction(), exécuté dans un processus
+    fils (fork) dont le pic part de la mémoire courante et non du pic des
+    étapes précédentes ; None sans resource / fork (Windows).
+    """
+    if instr.pic_rss_mo() is None or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    contexte = multiprocessing.get_context("fork")
+    reception, envoi = contexte.Pipe(duplex=False)
+    fils = contexte.Process(target=_hausse_pic, args=(fonction, envoi))
+    fils.start()
+    envoi.close()
+    try:
+        return reception.recv()
+    finally:
+        fils.join()
+
+
+def mesurer(fonction, repetitions=3, memoire=True):
+    """
+    {"secondes": meilleur temps, "pic_mo": hausse du pic RSS (Python, NumPy,
+    Arrow...)} d'un appel de fonction() ; le pic est mesuré sur une
+    exécution à part, dans un processus fils.
+    """
+    temps = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        temps.append(time.perf_counter() - debut)
+
+    resultat = {"secondes": round(min(temps), 4)}
+    if memoire:
+        pic = _pic_rss(fonction)
+        resultat["pic_mo"] = None if pic is None else round(pic, 1)
+    return resultat
+
+
+# =================================================================
+# 🔵 2) ÉTAPES
+# =================================================================
+
+def etapes(racine, source_geo, dossier_geo):
+    """
+    {nom: fonction sans argument} des étapes mesurées sur le jeu écrit dans
+    `racine` (et `source_geo` s'il y a des contours). Les tables d'entrée
+    sont lues une fois ici : seules les étapes elles-mêmes sont chronométrées.
+    """
+    derniere = store.derniere_annee(racine=racine)
+    table_annee = store.lire_table(store.TABLE_COMMUNES, filtres={"AN": derniere}, racine=racine)
+    historique = store.lire_table(store.TABLE_COMMUNES, colonnes=["insee_com", "DEP", "AN", "LOG"], racine=racine)
+    reference_tension = ml.figer_tension(derniere, table_annee, persister=False)
+
+    # Fonctions d'origine (sans st.cache_data : ni hachage ni copie des entrées)
+    profils = ml.identifier_profils_communes.__wrapped__
+    tension = ml.calculer_tension_immobiliere.__wrapped__
+
+    mesures = {
+        "lecture_table": lambda: store.lire_table(store.TABLE_COMMUNES, racine=racine),
+        "lecture_annee": lambda: store.lire_table(store.TABLE_COMMUNES, filtres={"AN": derniere}, racine=racine),
+        "coloration_lineaire": lambda: couleurs.couleurs_rgba(table_annee["Plog_VAC"], schema="lineaire"),
+        "coloration_quantiles": lambda: couleurs.couleurs_rgba(table_annee["Plog_VAC"], schema="quantiles"),
+        "coloration_jenks": lambda: couleurs.couleurs_rgba(table_annee["Plog_VAC"], schema="jenks"),
+        "profils": lambda: profils(table_annee, 5, persister=False),
+        "tension": lambda: tension(table_annee, persister=False),
+        "tension_par_annee": lambda: ml.tension_par_annee(artefact=reference_tension, racine=racine),
+        "previsions": lambda: prev.prevoir(historique, n_workers=1),
+    }
+    if source_geo is not None:
+        mesures["construction_contours"] = lambda: geo.construire_niveaux(source_geo, dossier_geo)
+        mesures["lecture_contours"] = lambda: geo.charger_niveau(geo.NIVEAU_REFERENCE, dossier_geo)
+    return mesures
+
+
+def executer_echelle(echelle, n_lignes, dossier, repetitions=3, memoire=True, contours=True, selection=None):
+    """Écrit le jeu synthétique de l'échelle puis mesure chaque étape."""
+    debut = time.perf_counter()
+    racine, source_geo = donnees.ecrire_jeu(Path(dossier) / echelle, n_lignes, contours=contours)
+    print(f"[{echelle}] jeu de {n_lignes} lignes écrit en {time.perf_counter() - debut:.1f} s")
+
+    dossier_geo = Path(dossier) / echelle / "geometries"
+    if source_geo is not None:
+        geo.construire_niveaux(source_geo, dossier_geo)   # fichiers lus par lecture_contours
+
+    resultats = {}
+    for nom, fonction in etapes(racine, source_geo, dossier_geo).items():
+        if selection and nom not in selection:
+            continue
+        # La construction des contours est longue : une seule répétition
+        n = 1 if nom == "construction_contours" else repetitions
+        resultats[nom] = mesurer(fonction, n, memoire)
+        print(f"[{echelle}] {nom:<22} {resultats[nom]['secondes']:>9.3f} s"
+              + (f"  {resultats[nom]['pic_mo']:>8.1f} Mo" if resultats[nom].get("pic_mo") is not None else ""))
+    return resultats
+
+
+# =================================================================
+# 🔵 3) RÉSULTATS ET RÉFÉRENCE
+# =================================================================
+
+def environnement():
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processeur": platform.processor() or platform.machine(),
+    }
+
+
+def comparer(resultats, reference, tolerance=TOLERANCE, plancher=PLANCHER):
+    """
+    Liste des régressions (échelle, étape, temps, référence, ratio) : temps
+    supérieur à tolerance × référence, pour les étapes de plus de `plancher` s.
+    """
+    regressions = []
+    for echelle, mesures in resultats.items():
+        for nom, mesure in mesures.items():
+            ref = reference.get(echelle, {}).get(nom)
+            if ref is None or max(ref["secondes"], mesure["secondes"]) < plancher:
+                continue
+            ratio = mesure["secondes"] / max(ref["secondes"], 1e-9)
+            if ratio > tolerance:
+                regressions.append((echelle, nom, mesure["secondes"], ref["secondes"], round(ratio, 2)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks des étapes principales sur données synthétiques.")
+    parser.add_argument("--echelles", nargs="*", choices=list(donnees.ECHELLES), default=["petite", "moyenne"])
+    parser.add_argument("--etapes", nargs="*", default=None, help="étapes mesurées (défaut : toutes)")
+    parser.add_argument("--repetitions", type=int, default=3, help="répétitions par étape (meilleur temps)")
+    parser.add_argument("--sans-memoire", action="store_true", help="ne pas mesurer le pic mémoire")
+    parser.add_argument("--sans-contours", action="store_true", help="ignorer les étapes de contours")
+    parser.add_argument("--reference", default=str(FICHIER_REFERENCE), help="fichier JSON de référence")
+    parser.add_argument("--sauver-reference", action="store_true", help="remplacer la référence par ces mesures")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--sortie", default=DOSSIER_RESULTATS, help="dossier des résultats JSON")
+    args = parser.parse_args(argv)
+
+    resultats = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        for echelle in args.echelles:
+            resultats[echelle] = executer_echelle(
+                echelle, donnees.ECHELLES[echelle], dossier, args.repetitions,
+                not args.sans_memoire, not args.sans_contours, args.etapes,
+            )
+
+    rapport = {"environnement": environnement(), "resultats": resultats}
+    Path(args.sortie).mkdir(parents=True, exist_ok=True)
+    chemin = Path(args.sortie) / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    chemin.write_text(json.dumps(rapport, indent=1, ensure_ascii=False), encoding="utf-8")
+    print(f"Résultats → {chemin}")
+
+    reference_chemin = Path(args.reference)
+    if args.sauver_reference:
+        reference = json.loads(reference_chemin.read_text(encoding="utf-8")) if reference_chemin.exists() else {}
+        reference.setdefault("resultats", {}).update(resultats)
+        reference["environnement"] = rapport["environnement"]
+        reference_chemin.write_text(json.dumps(reference, indent=1, ensure_ascii=False), encoding="utf-8")
+        print(f"Référence mise à jour → {reference_chemin}")
+        return 0
+
+    if not reference_chemin.exists():
+        print("Pas de référence : lancer avec --sauver-reference pour en enregistrer une.")
+        return 0
+
+    regressions = comparer(resultats, json.loads(reference_chemin.read_text(encoding="utf-8"))["resultats"],
+                           args.tolerance)
+    for echelle, nom, secondes, ref, ratio in regressions:
+        print(f"RÉGRESSION [{echelle}] {nom} : {secondes:.3f} s contre {ref:.3f} s (×{ratio})")
+    if not regressions:
+        print(f"Aucune étape au-delà de ×{args.tolerance} de la référence.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
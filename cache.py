@@ -0,0 +1,232 @@
+# ================================================================
+# 💾 CACHE PARTAGÉ — Tables de l'application en Arrow IPC
+# ================================================================
+# Ce module regroupe :
+# 1. Clé de cache : fonction + arguments + empreinte des sources
+#    (marqueur de version de chaque table Parquet, sinon tailles / dates
+#    des fichiers lus)
+# 2. Stockage : un fichier Arrow IPC par résultat, lu en memory map
+#    (les pages sont partagées par tous les processus de la machine) ;
+#    les colonnes numériques sont rendues sans copie, en lecture seule
+# 3. Éviction LRU bornée en taille, métriques hits / miss
+# 4. Décorateur en_cache pour les fonctions qui retournent un DataFrame
+# ================================================================
+# Le dossier est commun à tous les réplicas qui le voient :
+#   OPENDATA_CACHE=/dev/shm/opendata  → mémoire partagée (tmpfs) d'une machine
+#   OPENDATA_CACHE=/mnt/partage/cache → disque partagé entre machines
+# OPENDATA_CACHE_MO fixe la taille maximale (Mo) avant éviction.
+
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import pyarrow as pa
+
+import data_store as store
+
+
+DOSSIER_CACHE = os.environ.get("OPENDATA_CACHE", "SORTIE/cache_app")
+TAILLE_MAX = int(os.environ.get("OPENDATA_CACHE_MO", "512")) * 1024 * 1024
+
+EXTENSION = ".arrow"
+
+# Métriques du processus courant (chaque réplica a les siennes)
+METRIQUES = {"hits": 0, "miss": 0, "ecritures": 0, "evictions": 0, "secondes_lecture": 0.0,
+             "secondes_calcul": 0.0}
+
+
+# =================================================================
+# 🔵 1) CLÉ DE CACHE
+# =================================================================
+
+def _empreinte_fichiers(chemin, h):
+    fichiers = sorted(chemin.rglob("*")) if chemin.is_dir() else [chemin]
+    for fichier in fichiers:
+        if fichier.is_file():
+            etat = fichier.stat()
+            h.update(f"{fichier}|{etat.st_size}|{etat.st_mtime_ns}".encode())
+
+
+def empreinte_sources(sources):
+    """
+    Empreinte des sources : une table réécrite par le pipeline change la
+    clé, l'ancienne entrée n'est plus lue puis sort du cache par éviction.
+    Une table du data store compte par son marqueur de version (un fichier
+    lu, quel que soit le nombre de partitions) ; les autres fichiers par
+    leur chemin, taille et date.
+    """
+    h = hashlib.sha256()
+    for source in sources:
+        racine = Path(source)
+        if not racine.is_dir():
+            _empreinte_fichiers(racine, h)
+            continue
+        for chemin in sorted(racine.iterdir()):
+            marqueur = chemin / store.FICHIER_VERSION
+            if marqueur.is_file():
+                h.update(f"{chemin}|{marqueur.read_text(encoding='utf-8')}".encode())
+            else:
+                _empreinte_fichiers(chemin, h)
+    return h.hexdigest()
+
+
+def cle(nom, args=(), kwargs=None, sources=()):
+    """Clé hexadécimale d'un appel : nom de la fonction, arguments (JSON) et sources."""
+    h = hashlib.sha256()
+    h.update(nom.encode())
+    h.update(json.dumps([list(args), kwargs or {}], sort_keys=True, default=str).encode())
+    h.update(empreinte_sources(sources).encode())
+    return h.hexdigest()[:32]
+
+
+# =================================================================
+# 🔵 2) LECTURE / ÉCRITURE ARROW IPC
+# =================================================================
+
+def _chemin(cle_cache, dossier):
+    return Path(dossier) / f"{cle_cache}{EXTENSION}"
+
+
+def _vers_arrow(df):
+    """Table Arrow d'un DataFrame (types pandas conservés) ou d'un GeoDataFrame (géométrie en WKB)."""
+    if isinstance(df, gpd.GeoDataFrame):
+        return pa.table(df.to_arrow(index=False, geometry_encoding="WKB"))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _est_geometrie(champ):
+    return (champ.metadata or {}).get(b"ARROW:extension:name", b"").startswith(b"geoarrow")
+
+
+def _depuis_arrow(table):
+    """
+    DataFrame lu depuis la table memory-mappée : une colonne numérique sans
+    valeur manquante y reste un bloc à part, sans copie (tableau NumPy en
+    lecture seule sur les pages du fichier, partagées entre processus).
+    """
+    if any(_est_geometrie(champ) for champ in table.schema):
+        return gpd.GeoDataFrame.from_arrow(table)
+    return table.to_pandas(split_blocks=True)
+
+
+def lire(cle_cache, dossier=DOSSIER_CACHE):
+    """DataFrame en cache pour `cle_cache`, ou None (miss)."""
+    chemin = _chemin(cle_cache, dossier)
+    debut = time.perf_counter()
+    try:
+        with pa.memory_map(str(chemin), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        # Dernier accès = date du fichier (ordre LRU commun à tous les processus)
+        os.utime(chemin)
+    except (FileNotFoundError, pa.ArrowInvalid):
+        METRIQUES["miss"] += 1
+        return None
+
+    METRIQUES["hits"] += 1
+    df = _depuis_arrow(table)
+    METRIQUES["secondes_lecture"] += time.perf_counter() - debut
+    return df
+
+
+def ecrire(cle_cache, df, dossier=DOSSIER_CACHE, taille_max=TAILLE_MAX):
+    """Écrit le résultat (fichier temporaire puis renommage), puis applique l'éviction."""
+    chemin = _chemin(cle_cache, dossier)
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    table = _vers_arrow(df)
+
+    fd, tmp = tempfile.mkstemp(dir=chemin.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, chemin)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    METRIQUES["ecritures"] += 1
+    evincer(dossier, taille_max)
+    return chemin
+
+
+# =================================================================
+# 🔵 3) ÉVICTION ET MÉTRIQUES
+# =================================================================
+
+def _entrees(dossier):
+    """(date du dernier accès, taille, chemin) des entrées, de la plus ancienne à la plus récente."""
+    entrees = []
+    for chemin in Path(dossier).glob(f"*{EXTENSION}"):
+        try:
+            etat = chemin.stat()
+        except FileNotFoundError:   # évincée entre-temps par un autre processus
+            continue
+        entrees.append((etat.st_mtime_ns, etat.st_size, chemin))
+    return sorted(entrees)
+
+
+def evincer(dossier=DOSSIER_CACHE, taille_max=TAILLE_MAX):
+    """Supprime les entrées les moins récemment lues tant que le total dépasse taille_max."""
+    entrees = _entrees(dossier)
+    total = sum(taille for _, taille, _ in entrees)
+    for _, taille, chemin in entrees:
+        if total <= taille_max:
+            break
+        chemin.unlink(missing_ok=True)
+        total -= taille
+        METRIQUES["evictions"] += 1
+    return total
+
+
+def vider(dossier=DOSSIER_CACHE):
+    for _, _, chemin in _entrees(dossier):
+        chemin.unlink(missing_ok=True)
+
+
+def etat(dossier=DOSSIER_CACHE):
+    """Métriques du processus + occupation du dossier partagé."""
+    entrees = _entrees(dossier)
+    appels = METRIQUES["hits"] + METRIQUES["miss"]
+    return {
+        **METRIQUES,
+        "taux_hits": METRIQUES["hits"] / appels if appels else None,
+        "entrees": len(entrees),
+        "octets": sum(taille for _, taille, _ in entrees),
+        "octets_max": TAILLE_MAX,
+    }
+
+
+# =================================================================
+# 🔵 4) DÉCORATEUR
+# =================================================================
+
+def en_cache(sources=(store.RACINE_PARQUET,), dossier=None):
+    """
+    Met en cache partagé le DataFrame retourné par la fonction décorée.
+    La clé combine le nom qualifié, les arguments et l'empreinte des
+    `sources` (dossiers ou fichiers lus par la fonction).
+    `dossier` : None = DOSSIER_CACHE au moment de l'appel.
+    """
+    def decorateur(fonction):
+        nom = f"{fonction.__module__}.{fonction.__qualname__}"
+
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            cible = dossier or DOSSIER_CACHE
+            cle_cache = cle(nom, args, kwargs, sources)
+            resultat = lire(cle_cache, cible)
+            if resultat is None:
+                debut = time.perf_counter()
+                resultat = fonction(*args, **kwargs)
+                METRIQUES["secondes_calcul"] += time.perf_counter() - debut
+                ecrire(cle_cache, resultat, cible)
+            return resultat
+
+        return enveloppe
+
+    return decorateur
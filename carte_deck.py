@@ -0,0 +1,164 @@
+# ================================================================
+# 🗺️ CARTE DECK.GL — Contours envoyés une fois, couleurs seules ensuite
+# ================================================================
+# Ce module regroupe :
+# 1. Encodage compact : couleurs RGBA (uint8) et valeurs (float32) en
+#    base64, alignement d'une colonne sur l'ordre des contours
+# 2. Composant Streamlit (composants/carte_deck/index.html) : le navigateur
+#    garde les contours de la session (par version) ; un rerun n'envoie
+#    que les couleurs / valeurs, la vue et la surbrillance
+# 3. Mode pydeck (st.pydeck_chart, Deck complet à chaque rerun) en repli
+# ================================================================
+# OPENDATA_CARTE=pydeck     → st.pydeck_chart (sans accès au CDN de deck.gl)
+# OPENDATA_DECKGL_URL       → bundle deck.gl chargé par le composant
+
+import base64
+import os
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+import streamlit.components.v1 as components
+
+
+MODE = os.environ.get("OPENDATA_CARTE", "composant")
+DECKGL_URL = os.environ.get("OPENDATA_DECKGL_URL", "https://cdn.jsdelivr.net/npm/deck.gl@9.1/dist.min.js")
+
+COULEUR_ABSENTE = (210, 210, 210, 255)   # communes des contours sans donnée
+
+STYLE_INFOBULLE = {
+    "backgroundColor": "#faf6ef",
+    "color": "#8b5e3c",
+    "border": "1px solid #d17842",
+    "borderRadius": "5px",
+}
+
+_composant = components.declare_component(
+    "carte_deck", path=str(Path(__file__).with_name("composants") / "carte_deck")
+)
+
+
+# =================================================================
+# 🔵 1) ENCODAGE ET ALIGNEMENT
+# =================================================================
+
+def encoder(tableau, dtype):
+    """Tableau NumPy → chaîne base64 de ses octets (lue en Uint8Array / Float32Array côté navigateur)."""
+    return base64.b64encode(np.ascontiguousarray(tableau, dtype=dtype).tobytes()).decode("ascii")
+
+
+def aligner(codes_contours, codes, valeurs, defaut=np.nan):
+    """
+    `valeurs` (une ligne par code de `codes`) dans l'ordre des contours ;
+    `defaut` pour les communes des contours absentes de `codes`.
+    """
+    positions = pd.Index(codes).get_indexer(codes_contours)
+    valeurs = np.asarray(valeurs)
+    sortie = valeurs[positions]
+    sortie[positions < 0] = defaut
+    return sortie
+
+
+# =================================================================
+# 🔵 2) COMPOSANT (CONTOURS GARDÉS PAR LE NAVIGATEUR)
+# =================================================================
+
+@st.cache_resource(max_entries=8)
+def _geojson(version, _contours):
+    """
+    FeatureCollection des contours (propriétés : nom, rang i de la commune),
+    sérialisée une fois par version pour tout le serveur.
+    """
+    feuille = gpd.GeoDataFrame(
+        {"nom": _contours["nom"].astype(object).fillna(_contours["insee_com"]).to_numpy(),
+         "i": np.arange(len(_contours))},
+        geometry=_contours.geometry.to_numpy(), crs=_contours.crs,
+    )
+    return feuille.to_json(drop_id=True)
+
+
+def _composant_deck(contours, version, rgba, valeurs, cle, vue, surbrillance, marqueur,
+                    infobulle, classes, hauteur, ligne):
+    # Versions de contours que le navigateur garde déjà (valeur renvoyée par le composant)
+    tenues = st.session_state.get(cle) or []
+    return _composant(
+        deckgl_url=DECKGL_URL,
+        version=version,
+        tenues=tenues,
+        geometrie=None if version in tenues else _geojson(version, contours),
+        couleurs=encoder(rgba, np.uint8),
+        valeurs=None if valeurs is None else encoder(valeurs, np.float32),
+        classes=classes,
+        vue=vue,
+        surbrillance=None if surbrillance is None else surbrillance.to_json(drop_id=True),
+        marqueur=marqueur,
+        infobulle=infobulle,
+        style_infobulle=STYLE_INFOBULLE,
+        ligne=ligne,
+        hauteur=hauteur,
+        key=cle,
+        default=[],
+    )
+
+
+# =================================================================
+# 🔵 3) MODE PYDECK (DECK COMPLET À CHAQUE RERUN)
+# =================================================================
+
+def _pydeck(contours, rgba, valeurs, vue, surbrillance, marqueur, infobulle, classes, hauteur, ligne):
+    carte = contours[["nom", "geometry"]].copy()
+    carte["fill_color"] = rgba.tolist()
+    if valeurs is not None:
+        carte["valeur"] = np.round(valeurs, 1)
+        if classes is not None:
+            carte["classe"] = pd.Series(valeurs).map(lambda v: classes.get(str(int(v)), "") if v == v else "").to_numpy()
+
+    layers = [pdk.Layer(
+        "GeoJsonLayer", carte, pickable=True, stroked=True, filled=True, wireframe=True,
+        get_fill_color="fill_color", get_line_color=ligne["couleur"], get_line_width=ligne["epaisseur"],
+    )]
+    if surbrillance is not None:
+        layers.append(pdk.Layer(
+            "GeoJsonLayer", data=surbrillance, stroked=True, filled=False,
+            get_line_color=[0, 0, 0, 255], get_line_width=3, line_width_units="pixels",
+        ))
+    if marqueur is not None:
+        layers.append(pdk.Layer(
+            "TextLayer", data=pd.DataFrame([marqueur]), get_position="coordinates", get_text="text",
+            get_color=[0, 0, 0, 200], get_size=16, get_alignment_baseline="'bottom'",
+        ))
+
+    deck = pdk.Deck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=vue["centre_lat"], longitude=vue["centre_lon"],
+                                         zoom=vue["zoom"], pitch=0, bearing=0),
+        map_style=None,
+        tooltip={"html": infobulle, "style": STYLE_INFOBULLE},
+    )
+    st.pydeck_chart(deck, use_container_width=True, height=hauteur)
+
+
+# =================================================================
+# 🔵 4) AFFICHAGE
+# =================================================================
+
+def afficher(contours, version, rgba, valeurs=None, cle="carte", vue=None, surbrillance=None,
+             marqueur=None, infobulle="<b>{nom}</b>", classes=None, hauteur=600,
+             ligne=None):
+    """
+    Carte choroplèthe des `contours` (GeoDataFrame WGS84 : insee_com, nom,
+    geometry), colorée par `rgba` (n, 4) uint8 aligné sur ses lignes.
+    version : identifiant des contours (niveau + empreinte des sources) ;
+        le navigateur les reçoit une fois par version et par session.
+    valeurs : (n,) flottants de l'infobulle ({valeur}, ou {classe} via
+        `classes` {code: libellé}) ; vue : {centre_lon, centre_lat, zoom}.
+    surbrillance : GeoDataFrame (contour noir) ; marqueur : {coordinates, text}.
+    """
+    ligne = ligne or {"couleur": [50, 50, 50], "epaisseur": 70}
+    if MODE == "pydeck":
+        return _pydeck(contours, rgba, valeurs, vue, surbrillance, marqueur, infobulle, classes, hauteur, ligne)
+    return _composant_deck(contours, version, rgba, valeurs, cle, vue, surbrillance, marqueur,
+                           infobulle, classes, hauteur, ligne)
@@ -0,0 +1,158 @@
+# ================================================================
+# 🎨 MODULE COULEURS — Coloration vectorisée des cartes choroplèthes
+# ================================================================
+# Ce module regroupe :
+# 1. Palettes (couleurs d'ancrage interpolées)
+# 2. Classifications : linéaire, quantiles, seuils naturels de Jenks
+# 3. Conversion d'une colonne numérique en tableau RGBA uint8 (NumPy)
+# ================================================================
+
+import numpy as np
+
+
+# Couleurs d'ancrage RGB, de la valeur la plus faible à la plus forte
+PALETTES = {
+    # Jaune pâle → rouge foncé (palette historique de la carte)
+    "jaune_rouge": [(255, 255, 200), (180, 0, 0)],
+    # Beige → brun (charte de l'application)
+    "beige_brun": [(250, 246, 239), (232, 168, 124), (209, 120, 66), (139, 94, 60)],
+    "bleus": [(239, 243, 255), (107, 174, 214), (8, 69, 148)],
+}
+
+SCHEMAS = ["lineaire", "quantiles", "jenks"]
+
+COULEUR_MANQUANTE = (200, 200, 200, 255)  # gris clair pour les NaN
+
+TAILLE_ECHANTILLON_JENKS = 1000
+
+
+# =================================================================
+# 🔵 1) PALETTES
+# =================================================================
+
+def interpoler_palette(palette, positions):
+    """Couleurs RGB (float) aux positions [0, 1] le long de la palette."""
+    ancres = np.asarray(PALETTES[palette] if isinstance(palette, str) else palette, dtype=float)
+    x = np.linspace(0, 1, len(ancres))
+    return np.column_stack([np.interp(positions, x, ancres[:, c]) for c in range(3)])
+
+
+# =================================================================
+# 🔵 2) CLASSIFICATIONS
+# =================================================================
+
+def _bornes_jenks(valeurs, n_classes):
+    """
+    Seuils naturels de Jenks (algorithme exact de Fisher, programmation
+    dynamique vectorisée sur l'axe des débuts de classe).
+    Pour les grands effectifs, calcul sur un échantillon de quantiles.
+    """
+    x = np.sort(valeurs)
+    if len(x) > TAILLE_ECHANTILLON_JENKS:
+        x = np.quantile(x, np.linspace(0, 1, TAILLE_ECHANTILLON_JENKS))
+    n = len(x)
+    n_classes = min(n_classes, n)
+
+    s1 = np.concatenate([[0.0], np.cumsum(x)])
+    s2 = np.concatenate([[0.0], np.cumsum(x ** 2)])
+
+    def cout(debuts, fin):
+        # Variance intra-classe (somme des carrés des écarts) de x[debut:fin]
+        effectif = fin - debuts
+        somme = s1[fin] - s1[debuts]
+        return (s2[fin] - s2[debuts]) - somme ** 2 / effectif
+
+    # erreur[j, i] : meilleure erreur pour x[:i] découpé en j+1 classes
+    erreur = np.full((n_classes, n + 1), np.inf)
+    debut_opt = np.zeros((n_classes, n + 1), dtype=int)
+    erreur[0, 1:] = cout(np.zeros(n, dtype=int), np.arange(1, n + 1))
+
+    for j in range(1, n_classes):
+        for i in range(j + 1, n + 1):
+            debuts = np.arange(j, i)
+            totaux = erreur[j - 1, debuts] + cout(debuts, i)
+            k = int(np.argmin(totaux))
+            erreur[j, i] = totaux[k]
+            debut_opt[j, i] = debuts[k]
+
+    # Remontée des coupures
+    bornes = [x[-1]]
+    fin = n
+    for j in range(n_classes - 1, 0, -1):
+        fin = debut_opt[j, fin]
+        bornes.append(x[fin - 1])
+    bornes.append(x[0])
+    return np.array(bornes[::-1])
+
+
+def calculer_bornes(valeurs, schema="lineaire", n_classes=5):
+    """
+    Bornes de classes (n_classes + 1 valeurs croissantes) selon le schéma.
+    En linéaire : seulement [min, max].
+    """
+    v = np.asarray(valeurs, dtype=float)
+    v = v[~np.isnan(v)]
+    if v.size == 0:
+        return np.array([0.0, 0.0])
+
+    if schema == "lineaire":
+        return np.array([v.min(), v.max()])
+    if schema == "quantiles":
+        return np.quantile(v, np.linspace(0, 1, n_classes + 1))
+    if schema == "jenks":
+        return _bornes_jenks(v, n_classes)
+    raise ValueError(f"Schéma de classification inconnu : {schema} (attendu : {SCHEMAS})")
+
+
+def normaliser(valeurs, schema="lineaire", n_classes=5, bornes=None):
+    """
+    Position [0, 1] de chaque valeur sur la palette (NaN conservés).
+    - linéaire : (v - min) / (max - min)
+    - quantiles / jenks : rang de la classe / (nombre de classes - 1)
+    """
+    v = np.asarray(valeurs, dtype=float)
+    if bornes is None:
+        bornes = calculer_bornes(v, schema, n_classes)
+
+    if schema == "lineaire":
+        etendue = bornes[-1] - bornes[0]
+        if etendue == 0:
+            norm = np.zeros_like(v)
+        else:
+            norm = (v - bornes[0]) / etendue
+    else:
+        n = len(bornes) - 1
+        classes = np.searchsorted(bornes[1:-1], v, side="left")
+        norm = classes / max(n - 1, 1)
+
+    norm = np.clip(norm, 0, 1)
+    norm[np.isnan(v)] = np.nan
+    return norm
+
+
+# =================================================================
+# 🔵 3) COULEURS RGBA
+# =================================================================
+
+def couleurs_rgba(valeurs, palette="jaune_rouge", schema="lineaire", n_classes=5,
+                  alpha=255, couleur_manquante=COULEUR_MANQUANTE):
+    """
+    Tableau (n, 4) uint8 des couleurs d'une colonne numérique.
+    Retourne aussi les bornes utilisées (pour la légende).
+    """
+    v = np.asarray(valeurs, dtype=float)
+    bornes = calculer_bornes(v, schema, n_classes)
+    norm = normaliser(v, schema, n_classes, bornes)
+
+    manquant = np.isnan(norm)
+    rgba = np.empty((len(v), 4), dtype=np.uint8)
+    rgba[:, :3] = np.rint(interpoler_palette(palette, np.where(manquant, 0, norm)))
+    rgba[:, 3] = alpha
+    rgba[manquant] = couleur_manquante
+    return rgba, bornes
+
+
+def couleurs_classes(palette="jaune_rouge", n_classes=5):
+    """Couleur RGB (uint8) de chaque classe, pour les légendes par paliers."""
+    positions = np.linspace(0, 1, n_classes) if n_classes > 1 else np.array([0.0])
+    return np.rint(interpoler_palette(palette, positions)).astype(np.uint8)
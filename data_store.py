@@ -0,0 +1,354 @@
+# ================================================================
+# 🗄️ MODULE DATA STORE — Stockage colonnaire Parquet
+# ================================================================
+# Ce module regroupe :
+# 1. Typage des tables (codes texte, catégories, comptes Int32)
+# 2. Écriture d'un dataset Parquet partitionné par AN et DEP
+# 3. Lecture avec projection de colonnes et filtres poussés au disque
+#    (table entière ou par lots)
+# 4. Vues longues (type d'habitat, statut...) calculées à la demande
+# ================================================================
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+# Dossier racine du dataset (relatif au dossier du projet)
+RACINE_PARQUET = "SORTIE/parquet"
+
+# Colonnes de partition (une arborescence AN=.../DEP=... par table)
+COLONNES_PARTITION = ["AN", "DEP"]
+
+# Codes géographiques : toujours en texte (2A/2B, zéros en tête)
+LARGEUR_CODES = {"insee_com": 5, "CODGEO": 5, "DEP": 2, "REG": 2}
+
+# Libellés répétés sur chaque ligne → type catégoriel
+COLONNES_CATEGORIELLES = ["LIBGEO", "TYPE_HABITAT", "TYPE_LOG", "STATUT", "TYPO", "ANNEE_CONS", "MODELE",
+                          "Nom_Profil", "Niveau"]
+
+# Indicateurs en pourcentage (float32), le reste des colonnes numériques sont des comptes
+PREFIXES_TAUX = ("Plog_", "Prp_")
+
+# Résultats de modèles (prévisions, erreurs, scores) : réels, non arrondis en comptes
+PREFIXES_REELS = ("LOG_PREVU", "RMSE", "MAE", "MAPE", "Score_")
+
+# Métadonnées d'une table (JSON à côté des fichiers Parquet ; le préfixe « _ »
+# l'écarte de la lecture du dataset)
+FICHIER_METADONNEES = "_metadonnees.json"
+
+# Marqueur de version d'une table, renouvelé à chaque écriture : la clé du
+# cache partagé lit ce fichier au lieu de parcourir toutes les partitions
+FICHIER_VERSION = "_version"
+
+
+# =================================================================
+# 🔵 1) TYPAGE
+# =================================================================
+
+def typer_table(df):
+    """
+    Applique les types du stockage colonnaire :
+    - codes géographiques en texte complété de zéros
+    - libellés en catégories
+    - AN en int16, taux et résultats de modèles en float32, comptes en Int32 (nullable)
+    """
+    df = df.copy()
+
+    for col, largeur in LARGEUR_CODES.items():
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.zfill(largeur)
+
+    for col in COLONNES_CATEGORIELLES:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    if "AN" in df.columns:
+        df["AN"] = df["AN"].astype("int16")
+
+    numeriques = df.select_dtypes(include="number").columns.drop("AN", errors="ignore")
+    for col in numeriques:
+        if col.startswith(PREFIXES_TAUX + PREFIXES_REELS):
+            df[col] = df[col].astype("float32")
+        else:
+            df[col] = df[col].round(0).astype("Int32")
+
+    return df
+
+
+def _schema_partitions(colonnes):
+    types = {"AN": pa.int16(), "DEP": pa.string()}
+    return pa.schema([(col, types.get(col, pa.string())) for col in colonnes])
+
+
+# =================================================================
+# 🔵 2) ÉCRITURE
+# =================================================================
+
+def ecrire_table(df, nom, racine=RACINE_PARQUET, partitions=COLONNES_PARTITION):
+    """
+    Écrit une table dans <racine>/<nom>/AN=.../DEP=.../*.parquet.
+    La table existante est entièrement remplacée : la nouvelle version est
+    écrite dans un dossier voisin puis substituée par renommage, l'ancienne
+    reste lisible jusque-là (et intacte si l'écriture échoue).
+    """
+    chemin = Path(racine) / nom
+    temporaire = chemin.with_name(f".{nom}.ecriture")
+    ancien = chemin.with_name(f".{nom}.ancien")
+    table = pa.Table.from_pandas(typer_table(df), preserve_index=False)
+
+    for dossier in (temporaire, ancien):
+        if dossier.exists():
+            shutil.rmtree(dossier)   # reste d'une écriture interrompue
+
+    try:
+        ds.write_dataset(
+            table,
+            temporaire,
+            format="parquet",
+            partitioning=ds.partitioning(_schema_partitions(partitions), flavor="hive"),
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+    except BaseException:
+        shutil.rmtree(temporaire, ignore_errors=True)
+        raise
+    marquer_version(temporaire)
+
+    if chemin.exists():
+        os.replace(chemin, ancien)
+    os.replace(temporaire, chemin)
+    shutil.rmtree(ancien, ignore_errors=True)
+    return chemin
+
+
+def marquer_version(dossier):
+    """Écrit un nouveau marqueur de version dans le dossier d'une table."""
+    (Path(dossier) / FICHIER_VERSION).write_text(uuid.uuid4().hex, encoding="utf-8")
+
+
+def ecrire_metadonnees(meta, nom, racine=RACINE_PARQUET):
+    """Enregistre un dict JSON avec la table `nom` (à appeler après ecrire_table)."""
+    chemin = Path(racine) / nom / FICHIER_METADONNEES
+    chemin.write_text(json.dumps(meta, indent=1, ensure_ascii=False), encoding="utf-8")
+    return chemin
+
+
+# =================================================================
+# 🔵 3) LECTURE (projection + pushdown)
+# =================================================================
+
+def ouvrir_dataset(nom, racine=RACINE_PARQUET, partitions=COLONNES_PARTITION):
+    """Ouvre le dataset sans rien lire (seulement les métadonnées)."""
+    return ds.dataset(
+        Path(racine) / nom,
+        format="parquet",
+        partitioning=ds.partitioning(_schema_partitions(partitions), flavor="hive"),
+    )
+
+
+def construire_filtre(filtres):
+    """
+    Transforme un dict {colonne: valeur ou liste de valeurs} en expression
+    pyarrow. Une expression déjà construite est renvoyée telle quelle.
+    """
+    if filtres is None or isinstance(filtres, ds.Expression):
+        return filtres
+
+    expression = None
+    for col, valeur in filtres.items():
+        if isinstance(valeur, (list, tuple, set)):
+            condition = ds.field(col).isin(list(valeur))
+        else:
+            condition = ds.field(col) == valeur
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def lire_table(nom, colonnes=None, filtres=None, racine=RACINE_PARQUET, partitions=COLONNES_PARTITION):
+    """
+    Lit une table du dataset.
+    - colonnes : liste des colonnes à charger (projection), None = toutes
+    - filtres  : dict {colonne: valeur(s)} ou expression pyarrow ; les
+      filtres sur AN/DEP éliminent des fichiers entiers sans les ouvrir.
+    - partitions : colonnes de partition utilisées à l'écriture
+    Les colonnes de partition sont retypées (AN int16, DEP catégorie).
+    """
+    table = ouvrir_dataset(nom, racine, partitions).to_table(
+        columns=colonnes,
+        filter=construire_filtre(filtres),
+    )
+    df = table.to_pandas()
+
+    if "AN" in df.columns:
+        df["AN"] = df["AN"].astype("int16")
+    if "DEP" in df.columns:
+        df["DEP"] = df["DEP"].astype("category")
+
+    return df
+
+
+def lire_lots(nom, colonnes=None, filtres=None, taille_lot=65536, racine=RACINE_PARQUET):
+    """
+    Parcourt une table par lots de `taille_lot` lignes au plus (DataFrames),
+    sans jamais la charger en entier : mêmes projection et filtres que lire_table.
+    """
+    scanner = ouvrir_dataset(nom, racine).scanner(
+        columns=colonnes,
+        filter=construire_filtre(filtres),
+        batch_size=taille_lot,
+    )
+    for lot in scanner.to_batches():
+        if lot.num_rows == 0:
+            continue
+        df = lot.to_pandas()
+        if "AN" in df.columns:
+            df["AN"] = df["AN"].astype("int16")
+        yield df
+
+
+def lire_metadonnees(nom, racine=RACINE_PARQUET):
+    """Métadonnées de la table `nom`, ou None si elles n'ont pas été écrites."""
+    chemin = Path(racine) / nom / FICHIER_METADONNEES
+    if not chemin.exists():
+        return None
+    return json.loads(chemin.read_text(encoding="utf-8"))
+
+
+def empreinte_table(nom, racine=RACINE_PARQUET):
+    """
+    Empreinte du contenu des fichiers de données de la table (chemin relatif
+    et octets, métadonnées exclues) : stable d'un clone à l'autre, elle
+    change dès que la table est réécrite avec d'autres données.
+    """
+    dossier = Path(racine) / nom
+    h = hashlib.sha256()
+    for chemin in sorted(dossier.rglob("*.parquet")):
+        h.update(chemin.relative_to(dossier).as_posix().encode())
+        h.update(chemin.read_bytes())
+    return h.hexdigest()
+
+
+def compter_lignes(nom, filtres=None, racine=RACINE_PARQUET):
+    """Nombre de lignes (métadonnées Parquet, sans lecture des colonnes)."""
+    return ouvrir_dataset(nom, racine).count_rows(filter=construire_filtre(filtres))
+
+
+# =================================================================
+# 🔵 4) VUES LONGUES À LA DEMANDE
+# =================================================================
+# Les tableaux longs des graphiques (ex-TAB_TYPEHAB, RP_SO...) ne sont plus
+# écrits sur disque : ils sont dérivés de la table large « communes » pour
+# les seules lignes demandées (une commune, quelques communes, une année).
+
+TABLE_COMMUNES = "communes"
+
+ID_VUES = ["insee_com", "DEP", "LIBGEO", "AN"]
+
+VUES_LONGUES = {
+    "TAB_TYPEHAB": {
+        "variable": "TYPE_HABITAT",
+        "id_supp": ["LOG"],
+        "libelles": {"APPART": "Appartements", "MAISON": "Maisons"},
+    },
+    "TAB_CATEHAB": {
+        "variable": "TYPE_LOG",
+        "libelles": {
+            "RP": "Résidences principales",
+            "RSECOCC": "Résidences secondaires et occasionnelles",
+            "LOGVAC": "Logements vacants",
+        },
+    },
+    "RP_TYPO": {
+        "variable": "TYPO",
+        "libelles": {"RP_1P": "T1", "RP_2P": "T2", "RP_3P": "T3", "RP_4P": "T4", "RP_5PP": "T5et+"},
+    },
+    "RP_CONS": {
+        "variable": "ANNEE_CONS",
+        "derniere_annee": True,
+        "libelles": {
+            "RP_ACH19": "Construites avant 1919",
+            "RP_ACH45": "Construites de 1919 à 1945",
+            "RP_ACH70": "Construites de 1946 à 1970",
+            "RP_ACH90": "Construites de 1971 à 1990",
+            "RP_ACH05": "Construites de 1991 à 2005",
+            "RP_ACH18": "Construites de 2006 à 2018",
+        },
+    },
+    "RP_SO": {
+        "variable": "STATUT",
+        "derniere_annee": True,
+        "libelles": {
+            "RP_LOCHLMV": "Locataire HLM (logement loué vide)",
+            "RP_LOCPRIV": "Locataire du parc privé (locataire hors logement HLM loué vide)",
+            "RP_PROP": "Propriétaire",
+            "RP_GRAT": "Logé gratuitement",
+        },
+    },
+}
+
+
+def annees_disponibles(nom=TABLE_COMMUNES, racine=RACINE_PARQUET):
+    """Années présentes, lues dans les noms de partitions (aucun fichier ouvert)."""
+    dataset = ouvrir_dataset(nom, racine)
+    return sorted({
+        int(ds.get_partition_keys(fragment.partition_expression)["AN"])
+        for fragment in dataset.get_fragments()
+    })
+
+
+def derniere_annee(nom=TABLE_COMMUNES, racine=RACINE_PARQUET):
+    """Dernière année disponible, lue dans les noms de partitions (aucun fichier ouvert)."""
+    return annees_disponibles(nom, racine)[-1]
+
+
+def colonnes_vue(nom):
+    """Colonnes de la table communes nécessaires à la vue `nom`."""
+    spec = VUES_LONGUES[nom]
+    return ID_VUES + spec.get("id_supp", []) + list(spec["libelles"])
+
+
+def fondre_vue(large, nom):
+    """Passe des lignes de la table communes (format large) à la vue longue `nom`."""
+    spec = VUES_LONGUES[nom]
+    libelles = spec["libelles"]
+    id_vars = ID_VUES + spec.get("id_supp", [])
+
+    long = large.reindex(columns=id_vars + list(libelles)).melt(
+        id_vars=id_vars,
+        value_vars=list(libelles),
+        var_name=spec["variable"],
+        value_name="NOMBRE",
+    )
+    long[spec["variable"]] = pd.Categorical(
+        long[spec["variable"]].map(libelles),
+        categories=list(libelles.values()),
+    )
+    long["NOMBRE"] = long["NOMBRE"].astype("Int32")
+    return long
+
+
+def vue_longue(nom, filtres=None, racine=RACINE_PARQUET):
+    """
+    Retourne la vue longue `nom` (clé de VUES_LONGUES) pour les lignes
+    sélectionnées par `filtres`, ex. {"LIBGEO": "Alès"} ou
+    {"insee_com": ["30007", "30189"], "AN": 2022}.
+    Seules les colonnes utiles de la table communes sont lues.
+    Colonnes : insee_com, DEP, LIBGEO, AN, [LOG], <variable>, NOMBRE.
+    """
+    filtres = dict(filtres or {})
+    if VUES_LONGUES[nom].get("derniere_annee") and "AN" not in filtres:
+        filtres["AN"] = derniere_annee(racine=racine)
+
+    # Les millésimes n'ont pas tous les mêmes variables : on ne projette que les présentes
+    disponibles = set(ouvrir_dataset(TABLE_COMMUNES, racine).schema.names)
+    colonnes = [col for col in colonnes_vue(nom) if col in disponibles]
+
+    large = lire_table(TABLE_COMMUNES, colonnes=colonnes, filtres=filtres, racine=racine)
+    return fondre_vue(large, nom)
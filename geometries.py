@@ -0,0 +1,252 @@
+# ================================================================
+# 🗺️ MODULE GÉOMÉTRIES — Niveaux de détail des contours communaux
+# ================================================================
+# Ce module regroupe :
+# 1. Simplification des contours sans trous ni chevauchements
+#    (les frontières partagées sont simplifiées une seule fois)
+# 2. Écriture d'un GeoParquet par niveau de détail (étape hors ligne) :
+#    déjà en WGS84, avec centroïdes et emprises précalculés
+# 3. Lecture par l'application (memory map, ni parsing GeoJSON ni reprojection)
+# 4. Vues de carte (commune, étendue globale) et niveau selon le zoom
+# ================================================================
+# lanceur : python geometries.py --source DATA/communes_30_34_clean.geojson
+#           (aussi appelé par pipeline.py quand le GeoJSON source change)
+
+import argparse
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+
+SOURCE_GEOJSON = "DATA/communes_30_34_clean.geojson"
+DOSSIER_GEOMETRIES = "SORTIE/geometries"
+
+CRS_SOURCE = 2154   # Lambert 93 (coordonnées des fichiers IGN, en mètres)
+CRS_CARTE = 4326    # WGS84 attendu par pydeck
+
+# Tolérance de simplification (mètres) par niveau ; 0 = contours d'origine
+NIVEAUX = {"fin": 0, "moyen": 100, "grossier": 400}
+
+# Zoom pydeck à partir duquel chaque niveau est servi
+ZOOM_NIVEAUX = {"grossier": 0, "moyen": 9, "fin": 11}
+
+# Décimales des coordonnées écrites (1e-4 degré ≈ 10 m)
+PRECISION = {"fin": 6, "moyen": 5, "grossier": 4}
+
+# Niveau de référence : contours complets + métadonnées (nom, centroïde, emprise)
+NIVEAU_REFERENCE = "fin"
+
+COLONNES_GEO = ["insee_com", "geometry"]
+COLONNES_SOURCE = ["insee_com", "nom", "insee_dep"]
+COLONNES_META = ["centre_lon", "centre_lat", "lon_min", "lat_min", "lon_max", "lat_max",
+                 "surface_km2", "zoom"]
+
+# Taille de référence de la carte (pixels) pour le zoom suggéré, et bornes du zoom
+TAILLE_CARTE = (800, 600)
+ZOOM_MIN, ZOOM_MAX = 5, 14
+
+
+# =================================================================
+# 🔵 1) SIMPLIFICATION TOPOLOGIQUE
+# =================================================================
+
+def _arcs(geometries):
+    """
+    Découpe les contours en arcs entre deux points triples : chaque
+    frontière partagée par deux communes n'apparaît qu'une fois.
+    """
+    reseau = shapely.union_all(shapely.boundary(geometries))
+    return shapely.get_parts(shapely.line_merge(reseau))
+
+
+def simplifier_couverture(gdf, tolerance, cle="insee_com"):
+    """
+    Simplifie un ensemble de polygones jointifs (CRS métrique) :
+    - les arcs sont simplifiés (Douglas-Peucker, extrémités fixes),
+    - les faces sont reconstruites puis rattachées à leur commune.
+    Une commune dont la reconstruction échoue garde une simplification
+    individuelle. Retourne une GeoSeries alignée sur gdf.
+    """
+    if tolerance <= 0:
+        return gdf.geometry.copy()
+
+    geometries = gdf.geometry.values
+    arcs = shapely.simplify(_arcs(geometries), tolerance, preserve_topology=True)
+    # Deux arcs simplifiés peuvent se croiser : on renoue le réseau avant de former les faces
+    reseau = shapely.get_parts(shapely.union_all(arcs))
+    faces = gpd.GeoDataFrame(
+        geometry=shapely.get_parts(shapely.polygonize(reseau)), crs=gdf.crs
+    )
+
+    # Rattachement d'une face à la commune qui contient son point intérieur
+    points = faces.set_geometry(faces.representative_point())
+    rattachement = gpd.sjoin(points, gdf[[cle, "geometry"]], how="inner", predicate="within")
+    faces = faces.loc[rattachement.index].assign(**{cle: rattachement[cle].to_numpy()})
+    reconstruites = faces.dissolve(by=cle).geometry
+
+    resultat = reconstruites.reindex(gdf[cle]).set_axis(gdf.index)
+
+    # Secours : commune sans face rattachée (trop petite pour la tolérance) ou invalide
+    echec = resultat.isna().to_numpy() | ~resultat.is_valid.to_numpy()
+    if echec.any():
+        resultat[echec] = gdf.geometry[echec].simplify(tolerance, preserve_topology=True)
+
+    return gpd.GeoSeries(resultat, index=gdf.index, crs=gdf.crs)
+
+
+# =================================================================
+# 🔵 2) ÉCRITURE DES NIVEAUX (étape hors ligne)
+# =================================================================
+
+def chemin_niveau(niveau, dossier=DOSSIER_GEOMETRIES):
+    return Path(dossier) / f"communes_{niveau}.parquet"
+
+
+def charger_contours(source=SOURCE_GEOJSON, cle="insee_com"):
+    """Contours d'origine en Lambert 93, triés par code commune."""
+    gdf = gpd.read_file(source, columns=[col for col in COLONNES_SOURCE if col != "geometry"])
+    gdf = gdf.set_crs(epsg=CRS_SOURCE, allow_override=True)
+    gdf[cle] = gdf[cle].astype(str).str.zfill(5)
+    return gdf.sort_values(cle, kind="stable").reset_index(drop=True)
+
+
+def metadonnees(contours):
+    """
+    Table des métadonnées de chaque commune : centroïde (calculé en
+    Lambert 93 puis converti en lon/lat), emprise WGS84, surface et
+    zoom suggéré pour cadrer la commune.
+    """
+    centres = contours.geometry.centroid.to_crs(epsg=CRS_CARTE)
+    emprises = contours.geometry.to_crs(epsg=CRS_CARTE).bounds.to_numpy()
+    meta = pd.DataFrame(
+        {
+            "centre_lon": centres.x.to_numpy(),
+            "centre_lat": centres.y.to_numpy(),
+            "lon_min": emprises[:, 0],
+            "lat_min": emprises[:, 1],
+            "lon_max": emprises[:, 2],
+            "lat_max": emprises[:, 3],
+            "surface_km2": contours.geometry.area.to_numpy() / 1e6,
+        },
+        index=contours.index,
+    )
+    meta["zoom"] = zoom_pour_emprise(meta["lon_min"], meta["lat_min"], meta["lon_max"], meta["lat_max"])
+    return meta[COLONNES_META]
+
+
+def construire_niveaux(source=SOURCE_GEOJSON, dossier=DOSSIER_GEOMETRIES, niveaux=NIVEAUX):
+    """
+    Écrit <dossier>/communes_<niveau>.parquet (GeoParquet) pour chaque niveau :
+    contours simplifiés, reprojetés en WGS84, coordonnées arrondies.
+    Le niveau de référence garde aussi nom, département, centroïde et emprise ;
+    les autres ne contiennent que insee_com (les variables sont jointes dans l'app).
+    """
+    Path(dossier).mkdir(parents=True, exist_ok=True)
+    contours = charger_contours(source)
+    meta = metadonnees(contours)
+    ecrits = {}
+
+    for niveau, tolerance in niveaux.items():
+        debut = time.perf_counter()
+        simplifie = contours.set_geometry(simplifier_couverture(contours, tolerance)).to_crs(epsg=CRS_CARTE)
+        # Accrochage à la grille (géométries valides), puis arrondi des flottants
+        # pour un JSON court côté navigateur
+        decimales = PRECISION.get(niveau, 6)
+        accroches = shapely.set_precision(simplifie.geometry.values, 10.0 ** -decimales)
+        simplifie.geometry.values[:] = shapely.transform(accroches, lambda xy: np.round(xy, decimales))
+
+        if niveau == NIVEAU_REFERENCE:
+            simplifie = simplifie.join(meta)[COLONNES_SOURCE + COLONNES_META + ["geometry"]]
+        else:
+            simplifie = simplifie[COLONNES_GEO]
+
+        chemin = chemin_niveau(niveau, dossier)
+        simplifie.to_parquet(chemin, index=False, compression="zstd")
+        ecrits[niveau] = chemin
+
+        sommets = shapely.get_num_coordinates(simplifie.geometry.values).sum()
+        print(f"{niveau:>8} : {sommets} sommets, {chemin.stat().st_size / 1e6:.2f} Mo "
+              f"({time.perf_counter() - debut:.1f} s)")
+
+    return ecrits
+
+
+# =================================================================
+# 🔵 3) LECTURE PAR L'APPLICATION
+# =================================================================
+
+def charger_niveau(niveau=NIVEAU_REFERENCE, dossier=DOSSIER_GEOMETRIES, colonnes=None):
+    """
+    Lit un niveau (fichier projeté sur le disque en memory map).
+    Retourne None si l'étape hors ligne n'a pas été lancée.
+    """
+    chemin = chemin_niveau(niveau, dossier)
+    if not chemin.exists():
+        return None
+    return gpd.read_parquet(chemin, columns=colonnes, memory_map=True)
+
+
+# =================================================================
+# 🔵 4) VUES DE CARTE ET NIVEAU DE DÉTAIL
+# =================================================================
+
+def _y_mercator(lat):
+    lat = np.radians(np.clip(lat, -85, 85))
+    return np.log(np.tan(np.pi / 4 + lat / 2))
+
+
+def zoom_pour_emprise(lon_min, lat_min, lon_max, lat_max, taille=TAILLE_CARTE, marge=0.6):
+    """
+    Zoom web-mercator qui fait tenir l'emprise dans une carte de `taille`
+    pixels (vectorisé). `marge` retire une fraction de niveau pour laisser
+    un peu de contexte autour.
+    """
+    largeur, hauteur = taille
+    etendue_x = np.maximum(np.asarray(lon_max) - np.asarray(lon_min), 1e-6) / 360
+    etendue_y = np.maximum(_y_mercator(lat_max) - _y_mercator(lat_min), 1e-6) / (2 * np.pi)
+    zoom = np.minimum(np.log2(largeur / 256 / etendue_x), np.log2(hauteur / 256 / etendue_y))
+    return np.round(np.clip(zoom - marge, ZOOM_MIN, ZOOM_MAX), 1)
+
+
+def vue_globale(meta):
+    """
+    Vue d'ensemble à partir des métadonnées (sans union des polygones) :
+    centre = moyenne des centroïdes pondérée par la surface, zoom = emprise totale.
+    """
+    poids = meta["surface_km2"].to_numpy()
+    emprise = (meta["lon_min"].min(), meta["lat_min"].min(), meta["lon_max"].max(), meta["lat_max"].max())
+    return {
+        "centre_lon": float(np.average(meta["centre_lon"], weights=poids)),
+        "centre_lat": float(np.average(meta["centre_lat"], weights=poids)),
+        "zoom": float(zoom_pour_emprise(*emprise)),
+        "emprise": tuple(float(v) for v in emprise),
+    }
+
+
+def vue_commune(ligne):
+    """Centre et zoom suggéré d'une commune (ligne de la table des métadonnées)."""
+    return {"centre_lon": float(ligne["centre_lon"]), "centre_lat": float(ligne["centre_lat"]),
+            "zoom": float(ligne["zoom"])}
+
+
+def niveau_pour_zoom(zoom, zooms=ZOOM_NIVEAUX):
+    """Niveau le plus détaillé dont le zoom minimal est atteint."""
+    atteints = [niveau for niveau, minimum in zooms.items() if zoom >= minimum]
+    return max(atteints, key=zooms.get) if atteints else min(zooms, key=zooms.get)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Contours communaux simplifiés par niveau de zoom.")
+    parser.add_argument("--source", default=SOURCE_GEOJSON, help="GeoJSON des communes (Lambert 93)")
+    parser.add_argument("--sortie", default=DOSSIER_GEOMETRIES, help="dossier des fichiers par niveau")
+    args = parser.parse_args(argv)
+
+    construire_niveaux(args.source, args.sortie)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# ================================================================
+# 🗂️ INDEX DES COMMUNES — Accès direct par code INSEE
+# ================================================================
+# Ce module regroupe :
+# 1. Tri des tables par code commune (insee_com, puis AN)
+# 2. Index code INSEE → tranche de lignes (accès O(1) sans balayage)
+# 3. Résolution nom → code(s) et libellés sans ambiguïté (homonymes)
+# ================================================================
+# L'index ne contient que des positions : il s'applique à la table triée
+# qui a servi à le construire (ou à toute table qui garde le même ordre,
+# ex. la sortie de ml.identifier_profils_communes).
+
+import numpy as np
+
+
+# =================================================================
+# 🔵 1) TRI
+# =================================================================
+
+def trier_par_commune(df, cle="insee_com"):
+    """Trie par code commune (puis par année si présente) et renumérote les lignes."""
+    tri = [cle] + (["AN"] if "AN" in df.columns else [])
+    return df.sort_values(tri, kind="stable").reset_index(drop=True)
+
+
+# =================================================================
+# 🔵 2) CONSTRUCTION DE L'INDEX
+# =================================================================
+
+def construire_index(df, cle="insee_com", nom="LIBGEO"):
+    """
+    Index d'une table déjà triée par `cle` :
+    - tranches : {code: slice des lignes de la commune}
+    - noms     : {code: nom de la commune}
+    - deps     : {code: département}
+    - codes_par_nom : {nom: [codes]} (plusieurs codes si homonymes)
+    """
+    codes = df[cle].astype(str).to_numpy()
+    if len(codes) > 1 and (codes[1:] < codes[:-1]).any():
+        raise ValueError("La table doit être triée par code commune (voir trier_par_commune).")
+
+    _, debuts, comptes = np.unique(codes, return_index=True, return_counts=True)
+    tranches = {codes[d]: slice(int(d), int(d + n)) for d, n in zip(debuts, comptes)}
+
+    noms = dict(zip(codes[debuts], df[nom].astype(str).to_numpy()[debuts]))
+    deps = {}
+    if "DEP" in df.columns:
+        deps = dict(zip(codes[debuts], df["DEP"].astype(str).to_numpy()[debuts]))
+
+    codes_par_nom = {}
+    for code, libelle_commune in noms.items():
+        codes_par_nom.setdefault(libelle_commune, []).append(code)
+
+    return {
+        "tranches": tranches,
+        "noms": noms,
+        "deps": deps,
+        "codes_par_nom": codes_par_nom,
+    }
+
+
+# =================================================================
+# 🔵 3) ACCÈS
+# =================================================================
+
+def lignes(df, index, code):
+    """Lignes de la commune `code` (vide si le code est absent)."""
+    return df.iloc[index["tranches"].get(code, slice(0, 0))]
+
+
+def lignes_multiples(df, index, codes):
+    """Lignes d'un ensemble de communes, dans l'ordre des codes demandés."""
+    positions = [
+        np.arange(t.start, t.stop)
+        for t in (index["tranches"].get(code) for code in codes)
+        if t is not None
+    ]
+    if not positions:
+        return df.iloc[0:0]
+    return df.iloc[np.concatenate(positions)]
+
+
+def resoudre_nom(index, nom):
+    """Code(s) INSEE portant ce nom (liste vide si inconnu)."""
+    return index["codes_par_nom"].get(nom, [])
+
+
+def libelle(index, code):
+    """Nom affichable : le code INSEE est ajouté quand le nom est partagé."""
+    nom = index["noms"].get(code, code)
+    if len(index["codes_par_nom"].get(nom, [])) > 1:
+        return f"{nom} ({code})"
+    return nom
+
+
+def codes_tries(index):
+    """Codes triés par nom de commune (ordre des listes déroulantes)."""
+    return sorted(index["noms"], key=lambda code: (index["noms"][code], code))
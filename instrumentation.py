@@ -0,0 +1,243 @@
+# ================================================================
+# ⏱️ INSTRUMENTATION — Temps, cache et tailles par exécution de page
+# ================================================================
+# Ce module regroupe :
+# 1. État de l'exécution courante (un rerun Streamlit = une liste de mesures,
+#    propre au thread qui l'exécute) ; identifiant et compteur d'exécutions
+#    dans st.session_state (chaque rerun a son propre thread)
+# 2. Décorateur instrumenter (chargeurs, fonctions ML) : durée, hit / miss
+#    du cache qu'il enveloppe, taille du DataFrame retourné
+# 3. Bloc mesure (onglets, rendu pydeck...) : durée et croissance du pic RSS ;
+#    fragments Streamlit, dont les reruns partiels ont leur propre bilan
+# 4. Journal JSON Lines (une ligne par exécution) pour agrégation
+# ================================================================
+# OPENDATA_JOURNAL : fichier du journal (vide = pas de journal)
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+try:
+    import resource   # absent sous Windows : pas de mesure mémoire
+except ImportError:
+    resource = None
+
+
+JOURNAL = os.environ.get("OPENDATA_JOURNAL", "SORTIE/journal/mesures.jsonl")
+
+_etat = threading.local()
+
+
+# =================================================================
+# 🔵 1) EXÉCUTION COURANTE
+# =================================================================
+
+def _courant():
+    if not hasattr(_etat, "mesures"):
+        _etat.mesures, _etat.actif, _etat.profondeur = [], False, 0
+        _etat.calculs, _etat.session, _etat.rerun, _etat.debut = {}, None, 0, 0.0
+        _etat.fragment = None
+    return _etat
+
+
+def pic_rss_mo():
+    """Pic de mémoire résidente du processus (Mo) depuis son démarrage."""
+    if resource is None:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pic / 1e6 if sys.platform == "darwin" else pic / 1e3   # octets sous macOS, Ko ailleurs
+
+
+def identifiant_session():
+    """Identifiant court et stable de la session Streamlit (journal, panneau de debug)."""
+    if "id_session" not in st.session_state:
+        st.session_state["id_session"] = uuid.uuid4().hex[:12]
+    return st.session_state["id_session"]
+
+
+def _numero_rerun():
+    """Numéro de l'exécution dans la session, incrémenté à chaque rerun (complet ou de fragment)."""
+    st.session_state["num_rerun"] = st.session_state.get("num_rerun", 0) + 1
+    return st.session_state["num_rerun"]
+
+
+def debut_rerun(session=None, fragment=None):
+    """
+    À appeler en tête de script : remet à zéro les mesures de l'exécution.
+    fragment : nom du fragment pour un rerun partiel (cf. fragment).
+    """
+    etat = _courant()
+    etat.mesures, etat.actif, etat.profondeur = [], True, 0
+    etat.session = identifiant_session() if session is None else session
+    etat.rerun, etat.fragment, etat.debut = _numero_rerun(), fragment, time.perf_counter()
+
+
+def mesures_courantes():
+    return list(_courant().mesures)
+
+
+def _ouvrir(nom, categorie):
+    """
+    Mesure inscrite dès son début (ordre d'appel : un chargeur précède ceux
+    qu'il appelle) et complétée à la fin ; hors exécution, non conservée.
+    """
+    etat = _courant()
+    entree = {"nom": nom, "categorie": categorie, "niveau": etat.profondeur}
+    if etat.actif:
+        etat.mesures.append(entree)
+    etat.profondeur += 1
+    return entree
+
+
+def _fermer(entree, debut):
+    _courant().profondeur -= 1
+    entree["secondes"] = round(time.perf_counter() - debut, 4)
+
+
+# =================================================================
+# 🔵 2) DÉCORATEUR (CHARGEURS, FONCTIONS ML)
+# =================================================================
+
+def _taille(resultat):
+    """Lignes, colonnes et octets (sans compter le contenu des objets) du DataFrame retourné."""
+    if isinstance(resultat, tuple) and resultat:
+        resultat = resultat[0]
+    if not isinstance(resultat, pd.DataFrame):
+        return {}
+    return {
+        "lignes": len(resultat),
+        "colonnes": resultat.shape[1],
+        "octets": int(resultat.memory_usage(index=False, deep=False).sum()),
+    }
+
+
+def instrumenter(mise_en_cache=None, nom=None, categorie="chargement"):
+    """
+    Décorateur : `mise_en_cache` (st.cache_data, st.cache_resource,
+    cache.en_cache(...) ou None) est appliqué à la fonction, et chaque appel
+    enregistre durée, statut du cache et taille du résultat. Un appel dont
+    la fonction d'origine n'a pas tourné est un hit.
+    """
+    def decorateur(fonction):
+        libelle = nom or fonction.__name__
+
+        @functools.wraps(fonction)
+        def calcul(*args, **kwargs):
+            calculs = _courant().calculs
+            calculs[libelle] = calculs.get(libelle, 0) + 1
+            return fonction(*args, **kwargs)
+
+        appel = mise_en_cache(calcul) if mise_en_cache is not None else calcul
+
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            calculs_avant = _courant().calculs.get(libelle, 0)
+            entree = _ouvrir(libelle, categorie)
+            debut = time.perf_counter()
+            try:
+                resultat = appel(*args, **kwargs)
+            finally:
+                _fermer(entree, debut)
+
+            if mise_en_cache is not None:
+                entree["cache"] = "miss" if _courant().calculs.get(libelle, 0) > calculs_avant else "hit"
+            entree.update(_taille(resultat))
+            return resultat
+
+        # Accès au cache sous-jacent (ex. load_table.clear())
+        enveloppe.clear = getattr(appel, "clear", None)
+        return enveloppe
+
+    return decorateur
+
+
+# =================================================================
+# 🔵 3) BLOCS (ONGLETS, RENDU)
+# =================================================================
+
+@contextlib.contextmanager
+def mesure(nom, categorie="bloc"):
+    """Durée d'un bloc de code et croissance du pic RSS pendant le bloc."""
+    pic_avant = pic_rss_mo()
+    entree = _ouvrir(nom, categorie)
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        _fermer(entree, debut)
+        if pic_avant is not None:
+            pic_apres = pic_rss_mo()
+            entree["pic_rss_mo"] = round(pic_apres, 1)
+            entree["hausse_pic_mo"] = round(pic_apres - pic_avant, 1)
+
+
+def fragment(fonction):
+    """
+    st.fragment instrumenté. Appelé pendant l'exécution de la page, le
+    fragment est une mesure de plus ; relancé seul (interaction avec un de
+    ses widgets), il ouvre et clôt sa propre exécution dans le journal.
+    """
+    @functools.wraps(fonction)
+    def corps(*args, **kwargs):
+        if _courant().actif:
+            with mesure(fonction.__name__, "fragment"):
+                return fonction(*args, **kwargs)
+        debut_rerun(fragment=fonction.__name__)
+        try:
+            with mesure(fonction.__name__, "fragment"):
+                return fonction(*args, **kwargs)
+        finally:
+            fin_rerun()
+
+    return st.fragment(corps)
+
+
+# =================================================================
+# 🔵 4) FIN D'EXÉCUTION ET JOURNAL
+# =================================================================
+
+def fin_rerun(journal=None):
+    """
+    Clôt l'exécution courante : ajoute son bilan (session, durée totale,
+    pic RSS, mesures) au journal si configuré, et le retourne pour l'affichage.
+    """
+    etat = _courant()
+    bilan = {
+        "horodatage": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "session": etat.session,
+        "rerun": etat.rerun,
+        "fragment": etat.fragment,
+        "secondes": round(time.perf_counter() - etat.debut, 4),
+        "pic_rss_mo": pic_rss_mo(),
+        "mesures": list(etat.mesures),
+    }
+    etat.actif = False
+
+    journal = JOURNAL if journal is None else journal
+    if journal:
+        chemin = Path(journal)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        with open(chemin, "a", encoding="utf-8") as f:
+            f.write(json.dumps(bilan, ensure_ascii=False) + "\n")
+    return bilan
+
+
+def lire_journal(journal=JOURNAL):
+    """Journal à plat (une ligne par mesure, avec session / rerun / fragment / horodatage) pour agrégation."""
+    lignes = []
+    with open(journal, encoding="utf-8") as f:
+        for ligne in f:
+            bilan = json.loads(ligne)
+            contexte = {cle: bilan.get(cle) for cle in ("horodatage", "session", "rerun", "fragment")}
+            lignes.extend({**contexte, **entree} for entree in bilan["mesures"])
+    return pd.DataFrame(lignes)
@@ -2,127 +2,350 @@
 # 🤖 MODULE ML — Version robuste et professionnelle (2025)
 # ================================================================
 # Ce module regroupe :
-# 1. Clustering automatique optimisé (Silhouette + KMeans)
+# 1. Clustering automatique optimisé (KMeans + choix de k : silhouette
+#    échantillonnée ou simplifiée, Calinski-Harabasz, Davies-Bouldin),
+#    variante MiniBatchKMeans en flux sur le data store (France entière)
 # 2. Score de tension immobilière basé sur PCA + pondération
+#    (scaler / KMeans / PCA persistés dans le registre, cf. ml_registry),
+#    ou figé sur une année de référence pour des mises à jour incrémentales
 # 3. Prédiction du nombre de logements (linéaire / exponentielle)
 # ================================================================
 
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
 from sklearn.decomposition import PCA
 from sklearn.linear_model import LinearRegression
 from scipy.optimize import curve_fit
+from joblib import Parallel, delayed
 import streamlit as st
+import data_store as store
+import ml_registry as registre
+import instrumentation as instr
+
+
+# Identifiants repris dans les résultats (ceux présents dans la table d'entrée)
+COLONNES_ID = ["insee_com", "LIBGEO", "DEP", "AN"]
+
+
+def _identifiants(data):
+    return [col for col in COLONNES_ID if col in data.columns]
+
+
+def _remplir_numeriques(data, colonnes=None):
+    """Copie des seules `colonnes` (toutes si None), NaN numériques remplacés par 0
+    (les colonnes catégorielles du data store n'acceptent pas 0).
+    Sur la table large (~150 colonnes), ne copier que les colonnes du modèle
+    évite de dupliquer toute la table à chaque appel."""
+    df = data if colonnes is None else data[[col for col in colonnes if col in data.columns]]
+    numeriques = df.select_dtypes(include="number").columns
+    return df.fillna({col: 0 for col in numeriques})
 
 
 # =================================================================
 # 🔵 1) CLUSTERING — Profils de communes
 # =================================================================
 
-@st.cache_data
-def identifier_profils_communes(data, k_max=5):
+# Critères de choix de k : (fonction de score, True si plus grand = meilleur)
+# - silhouette : exacte jusqu'à TAILLE_ECHANTILLON_SILHOUETTE lignes, échantillonnée au-delà
+# - silhouette_simplifiee : distances aux centres seulement, O(n·k)
+CRITERES_K = {
+    "silhouette": True,
+    "silhouette_simplifiee": True,
+    "calinski_harabasz": True,
+    "davies_bouldin": False,
+}
+
+TAILLE_ECHANTILLON_SILHOUETTE = 5000
+
+# Variables du clustering (parts en %)
+VARIABLES_PROFILS = ["Plog_RP", "Plog_RS", "Plog_VAC", "Plog_MAISON", "Plog_APPART"]
+
+# kmeans : Lloyd sur toute la matrice ; minibatch : MiniBatchKMeans (mises à jour par lots)
+METHODES_PROFILS = ["kmeans", "minibatch"]
+TAILLE_LOT = 4096
+
+
+# Colonnes lues pour les profils (les parts de maisons / appartements sont recalculées)
+COLONNES_SOURCE_PROFILS = ["Plog_RP", "Plog_RS", "Plog_VAC", "MAISON", "APPART", "LOG"]
+
+
+def _ajouter_parts_logement(df):
+    """Parts de maisons et d'appartements dans le parc (0 si LOG est nul)."""
+    for col, source in [("Plog_MAISON", "MAISON"), ("Plog_APPART", "APPART")]:
+        part = (df[source].astype(float) / df["LOG"].astype(float)) * 100
+        df[col] = part.replace([np.inf, -np.inf], np.nan).fillna(0)
+    return df
+
+
+def _nouveau_modele(k, methode="kmeans", random_state=42):
+    if methode == "kmeans":
+        return KMeans(n_clusters=k, random_state=random_state, n_init=10)
+    if methode == "minibatch":
+        return MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3, batch_size=TAILLE_LOT)
+    raise ValueError(f"Méthode inconnue : {methode} (attendu : {METHODES_PROFILS})")
+
+
+def _silhouette_simplifiee(X, model):
+    """Silhouette calculée avec les distances aux centres (a = son centre, b = centre voisin le plus proche)."""
+    distances = model.transform(X)
+    a = distances[np.arange(len(X)), model.labels_]
+    distances[np.arange(len(X)), model.labels_] = np.inf
+    b = distances.min(axis=1)
+    denominateur = np.maximum(a, b)
+    return float(np.mean(np.divide(b - a, denominateur, out=np.zeros_like(a), where=denominateur > 0)))
+
+
+def _score_k(X, model, critere, taille_echantillon, random_state):
+    labels = model.labels_
+    if critere == "silhouette":
+        echantillon = taille_echantillon if len(X) > taille_echantillon else None
+        return silhouette_score(X, labels, sample_size=echantillon, random_state=random_state)
+    if critere == "silhouette_simplifiee":
+        return _silhouette_simplifiee(X, model)
+    if critere == "calinski_harabasz":
+        return calinski_harabasz_score(X, labels)
+    if critere == "davies_bouldin":
+        return davies_bouldin_score(X, labels)
+    raise ValueError(f"Critère inconnu : {critere} (attendu : {list(CRITERES_K)})")
+
+
+def _ajuster_et_scorer(X, k, critere, taille_echantillon, random_state, methode):
+    model = _nouveau_modele(k, methode, random_state).fit(X)
+    return k, model, _score_k(X, model, critere, taille_echantillon, random_state)
+
+
+def selectionner_k(X_scaled, k_max=5, k_min=2, critere="silhouette", n_jobs=None,
+                   taille_echantillon=TAILLE_ECHANTILLON_SILHOUETTE, random_state=42,
+                   methode="kmeans"):
+    """
+    Ajuste un modèle (`methode`, cf. METHODES_PROFILS) par k candidat (en
+    parallèle si n_jobs > 1, -1 = tous les cœurs) et garde le meilleur selon `critere`.
+    Le modèle retenu est réutilisé tel quel (pas de réajustement final).
+    Retourne (modèle, {k: score}).
+    """
+    if critere not in CRITERES_K:
+        raise ValueError(f"Critère inconnu : {critere} (attendu : {list(CRITERES_K)})")
+
+    resultats = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_ajuster_et_scorer)(X_scaled, k, critere, taille_echantillon, random_state, methode)
+        for k in range(k_min, k_max + 1)
+    )
+
+    scores = {k: float(score) for k, _, score in resultats}
+    signe = 1 if CRITERES_K[critere] else -1
+    # À score égal, le plus petit k l'emporte (comme la boucle d'origine)
+    _, meilleur, _ = max(resultats, key=lambda r: (signe * r[2], -r[0]))
+    return meilleur, scores
+
+
+@instr.instrumenter(st.cache_data, categorie="ml")
+def identifier_profils_communes(data, k_max=5, critere="silhouette", n_jobs=None, methode="kmeans",
+                                persister=True):
     """
-    Clustering automatique basé sur KMeans + Silhouette.
+    Clustering automatique, k choisi entre 2 et k_max selon `critere`
+    (cf. CRITERES_K et selectionner_k).
+    methode : "kmeans" (défaut) ou "minibatch" (MiniBatchKMeans, plus rapide
+    sur les grandes tables). Pour la France entière sans tout charger,
+    voir identifier_profils_flux.
+    persister : réutilise le scaler / KMeans du registre ajustés sur les
+    mêmes données et paramètres, sinon ajuste puis enregistre.
+
+    Retourne (résultats, descriptions) ; résultats ne contient que les
+    identifiants, les variables du modèle, Profil et Nom_Profil (dans
+    l'ordre des lignes de data, à joindre sur insee_com).
     """
-    
-    df = data.copy().fillna(0)
+    variables = VARIABLES_PROFILS
 
-    # ======= AJOUT ESSENTIEL POUR TON CAS =======
-    # =============================================
+    identifiants = _identifiants(data)
+    df = _ajouter_parts_logement(_remplir_numeriques(data, identifiants + COLONNES_SOURCE_PROFILS))
 
-    variables = [
-        "Plog_RP",
-        "Plog_RS",
-        "Plog_VAC",
-        "Plog_MAISON",
-        "Plog_APPART"
-    ]
+    X = df[variables].to_numpy(dtype=float)
+    parametres = {"k_max": k_max, "critere": critere, "methode": methode, "variables": variables}
+    empreinte = registre.empreinte(X, parametres)
+    artefact = registre.charger("profils", empreinte) if persister else None
 
-    df = data.copy().fillna(0)
-    df["Plog_MAISON"] = (df["MAISON"] / df["LOG"]) * 100
-    df["Plog_APPART"] = (df["APPART"] / df["LOG"]) * 100
+    if artefact is not None:
+        profils = registre.appliquer(artefact, X)
+    else:
+        # Normalisation
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+
+        # Sélection automatique du meilleur nombre de clusters (2 → k_max),
+        # le modèle retenu sert directement de clustering final
+        final, _ = selectionner_k(X_scaled, k_max=k_max, critere=critere, n_jobs=n_jobs, methode=methode)
+        profils = final.labels_
+        if persister:
+            registre.sauver("profils", {"scaler": scaler, "kmeans": final}, empreinte, parametres,
+                            etapes=["scaler", "kmeans"])
 
-    X = df[variables]
+    df["Profil"] = profils
+    descriptions = _decrire_profils(df, variables)
+    df["Nom_Profil"] = df["Profil"].map(lambda x: descriptions[x]["nom"])
+
+    return df[identifiants + variables + ["Profil", "Nom_Profil"]], descriptions
 
-    # Normalisation
+
+@instr.instrumenter(st.cache_data, categorie="ml")
+def identifier_profils_flux(k_max=5, filtres=None, critere="silhouette_simplifiee",
+                            taille_lot=TAILLE_LOT, n_passes=2,
+                            taille_echantillon=TAILLE_ECHANTILLON_SILHOUETTE,
+                            racine=store.RACINE_PARQUET, random_state=42):
+    """
+    Profils des lignes de la table « communes » (toutes années par défaut,
+    ou `filtres`, ex. {"AN": 2022}) sans charger la table en entier :
+    1. passe de normalisation (StandardScaler.partial_fit par lot) et
+       tirage d'un échantillon aléatoire de `taille_echantillon` lignes ;
+    2. choix de k sur l'échantillon (MiniBatchKMeans) ;
+    3. `n_passes` passes de MiniBatchKMeans.partial_fit sur les lots,
+       à partir des centres trouvés sur l'échantillon ;
+    4. passe d'affectation.
+    Même sortie que identifier_profils_communes (identifiants, variables,
+    Profil, Nom_Profil) et mêmes descriptions.
+    """
+    variables = VARIABLES_PROFILS
+    identifiants = ["insee_com", "LIBGEO", "DEP", "AN"]
+    colonnes = identifiants + ["Plog_RP", "Plog_RS", "Plog_VAC", "MAISON", "APPART", "LOG"]
+
+    def lots():
+        for lot in store.lire_lots(store.TABLE_COMMUNES, colonnes, filtres, taille_lot, racine):
+            yield _ajouter_parts_logement(_remplir_numeriques(lot, colonnes))
+
+    # 1) Normalisation + échantillon
+    rng = np.random.default_rng(random_state)
+    total = store.compter_lignes(store.TABLE_COMMUNES, filtres, racine)
+    proba = min(1.0, taille_echantillon / max(total, 1))
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    echantillon = []
+    for lot in lots():
+        X = lot[variables].to_numpy(dtype=float)
+        scaler.partial_fit(X)
+        echantillon.append(X[rng.random(len(X)) < proba])
+
+    # 2) Choix de k sur l'échantillon
+    X_echantillon = scaler.transform(np.concatenate(echantillon))
+    initial, _ = selectionner_k(X_echantillon, k_max=k_max, critere=critere,
+                                taille_echantillon=taille_echantillon,
+                                random_state=random_state, methode="minibatch")
+    best_k = initial.n_clusters
+
+    # 3) Ajustement en flux
+    final = MiniBatchKMeans(n_clusters=best_k, init=initial.cluster_centers_, n_init=1,
+                            batch_size=taille_lot, random_state=random_state)
+    for _ in range(n_passes):
+        for lot in lots():
+            final.partial_fit(scaler.transform(lot[variables].to_numpy(dtype=float)))
+
+    # 4) Affectation
+    morceaux = []
+    for lot in lots():
+        lot["Profil"] = final.predict(scaler.transform(lot[variables].to_numpy(dtype=float)))
+        morceaux.append(lot[identifiants + variables + ["Profil"]])
+
+    df = pd.concat(morceaux, ignore_index=True)
+    df["DEP"] = df["DEP"].astype(str).astype("category")
+    df["LIBGEO"] = df["LIBGEO"].astype(str).astype("category")
+
+    descriptions = _decrire_profils(df, variables)
+    df["Nom_Profil"] = df["Profil"].map(lambda x: descriptions[x]["nom"])
 
-    # Sélection automatique du meilleur nombre de clusters (2 → k_max)
-    best_k = 2
-    best_sil = -1
+    return df, descriptions
 
-    for k in range(2, k_max + 1):
-        model = KMeans(n_clusters=k, random_state=42, n_init=10)
-        labels = model.fit_predict(X_scaled)
-        sil = silhouette_score(X_scaled, labels)
-        if sil > best_sil:
-            best_sil = sil
-            best_k = k
 
-    # Clustering final
-    final = KMeans(n_clusters=best_k, random_state=42, n_init=10)
-    profils = final.fit_predict(X_scaled)
+# Libellés des variables dans les descriptions
+LIBELLES_VARIABLES = {
+    "Plog_RP": "Résidences principales",
+    "Plog_RS": "Résidences secondaires",
+    "Plog_VAC": "Vacance",
+    "Plog_MAISON": "Part de maisons",
+    "Plog_APPART": "Part d'appartements",
+}
 
-    df["Profil"] = profils
+# Suffixe du nom de profil selon le signe de l'écart dominant
+NOMS_ECARTS = {
+    "Plog_RP": ("résidences principales élevées", "résidences principales faibles"),
+    "Plog_RS": ("résidences secondaires élevées", "peu de résidences secondaires"),
+    "Plog_VAC": ("vacance marquée", "vacance limitée"),
+    "Plog_MAISON": ("dominance des maisons", "faible part de maisons"),
+    "Plog_APPART": ("dominance des appartements", "faible part d'appartements"),
+}
 
-    global_means = df[variables].mean()
 
-    label_for_var = {
-        "Plog_RP": "Résidences principales",
-        "Plog_RS": "Résidences secondaires",
-        "Plog_VAC": "Vacance",
-        "Plog_MAISON": "Part de maisons",
-        "Plog_APPART": "Part d'appartements",
-    }
+def resumer_profils(df, variables=VARIABLES_PROFILS, colonne="Profil", territoire="DEP",
+                    n_territoires=2, stats_supp=("LOG", "RP", "LOGVAC")):
+    """
+    Table de synthèse des profils (une ligne par profil), en une passe groupby :
+    - effectif et part (% des lignes)
+    - moyenne de chaque variable et de `stats_supp` (si présentes)
+    - ecart_<var> : écart de la moyenne du profil à la moyenne globale
+    - territoires : [(code, nombre de lignes), ...] des `n_territoires` plus représentés
+    """
+    supp = [col for col in stats_supp if col in df.columns and col not in variables]
+    groupes = df.groupby(colonne, observed=True, sort=True)
 
-    label_for_name = {
-        "Plog_RP": ("résidences principales élevées", "résidences principales faibles"),
-        "Plog_RS": ("résidences secondaires élevées", "peu de résidences secondaires"),
-        "Plog_VAC": ("vacance marquée", "vacance limitée"),
-        "Plog_MAISON": ("dominance des maisons", "faible part de maisons"),
-        "Plog_APPART": ("dominance des appartements", "faible part d'appartements"),
-    }
+    resume = groupes[variables + supp].mean()
+    resume.insert(0, "effectif", groupes.size())
+    resume.insert(1, "part", resume["effectif"] / len(df) * 100 if len(df) else 0.0)
 
-    descriptions = {}
-    total_communes = len(df)
+    ecarts = resume[variables] - df[variables].mean()
+    resume[[f"ecart_{var}" for var in variables]] = ecarts.to_numpy()
+
+    if territoire in df.columns:
+        comptes = (
+            df[territoire].astype(str)
+            .groupby(df[colonne], observed=True)
+            .value_counts()
+        )
+        comptes = comptes[comptes > 0].groupby(level=0, sort=False).head(n_territoires)
+        resume["territoires"] = pd.Series({
+            profil: list(zip(serie.index.get_level_values(1), serie.to_numpy()))
+            for profil, serie in comptes.groupby(level=0, sort=False)
+        })
 
-    for p in range(best_k):
-        sous_df = df[df["Profil"] == p]
-        stats = sous_df[variables].mean()
+    return resume
 
-        deltas = {var: stats[var] - global_means[var] for var in variables}
-        insights = []
 
-        part = (len(sous_df) / total_communes) * 100 if total_communes else 0
-        insights.append(f"{len(sous_df)} communes ({part:.1f}% de l'échantillon)")
+def _decrire_profils(df, variables):
+    """
+    Nom, description et points saillants de chaque profil présent dans df
+    (à partir de resumer_profils) : un cluster vide du KMeans n'a pas de
+    ligne dans le résumé, ni de description.
+    """
+    resume = resumer_profils(df, variables)
+    descriptions = {}
 
-        for var, label in label_for_var.items():
+    for p, ligne in resume.iterrows():
+        p = int(p)
+        effectif = int(ligne["effectif"])
+        deltas = {var: ligne[f"ecart_{var}"] for var in variables}
+
+        insights = [f"{effectif} communes ({ligne['part']:.1f}% de l'échantillon)"]
+
+        for var, label in LIBELLES_VARIABLES.items():
             delta = deltas[var]
             if np.isnan(delta):
                 continue
             if delta >= 5:
-                insights.append(f"{label} supérieures à la moyenne ({stats[var]:.1f}% ; {delta:.1f} pts)")
+                insights.append(f"{label} supérieures à la moyenne ({ligne[var]:.1f}% ; {delta:.1f} pts)")
             elif delta <= -5:
-                insights.append(f"{label} inférieures à la moyenne ({stats[var]:.1f}% ; {delta:.1f} pts)")
+                insights.append(f"{label} inférieures à la moyenne ({ligne[var]:.1f}% ; {delta:.1f} pts)")
 
-        if "DEP" in sous_df.columns:
-            deps = sous_df["DEP"].astype(str).value_counts().head(2)
-            if not deps.empty:
-                dep_txt = ", ".join([
-                    f"{dep} ({count / len(sous_df) * 100:.0f}%".rstrip("0").rstrip(".") + "%)"
-                    for dep, count in deps.items()
-                ])
-                insights.append(f"Répartition des départements : {dep_txt}")
+        territoires = ligne.get("territoires")
+        if isinstance(territoires, list) and territoires:
+            dep_txt = ", ".join([
+                f"{dep} ({count / effectif * 100:.0f}%".rstrip("0").rstrip(".") + "%)"
+                for dep, count in territoires
+            ])
+            insights.append(f"Répartition des départements : {dep_txt}")
 
         significant_deltas = sorted(deltas.items(), key=lambda kv: abs(kv[1]), reverse=True)
         suffix = "profil équilibré"
         for var, delta in significant_deltas:
             if abs(delta) >= 3:
-                name_options = label_for_name.get(var)
+                name_options = NOMS_ECARTS.get(var)
                 if name_options:
                     suffix = name_options[0] if delta >= 0 else name_options[1]
                     break
@@ -141,17 +364,32 @@ def identifier_profils_communes(data, k_max=5):
             "insights": insights[:5]
         }
 
-    df["Nom_Profil"] = df["Profil"].map(lambda x: descriptions[x]["nom"])
-
-    return df, descriptions
+    return descriptions
 
 
 # =================================================================
 # 🔵 2) SCORE DE TENSION IMMOBILIÈRE (Méthode PCA pondérée)
 # =================================================================
 
-@st.cache_data
-def calculer_tension_immobiliere(data):
+VARIABLES_TENSION = ["Plog_VAC", "Plog_RS", "Prp_RP_PROP"]
+
+NIVEAUX_TENSION = ["🟢 Faible", "🟡 Modérée", "🟠 Élevée", "🔴 Très élevée"]
+
+
+def _niveau_tension(score):
+    return pd.cut(score, bins=[0, 25, 50, 75, 100], labels=NIVEAUX_TENSION, include_lowest=True)
+
+
+def _score_tension(artefact, X):
+    """Composante PCA ramenée sur 0-100 avec les bornes de l'ajustement (écrêtée pour les nouvelles communes)."""
+    composante = registre.appliquer(artefact, X).flatten()
+    minimum, maximum = artefact["objets"]["bornes"]
+    score = (composante - minimum) / (maximum - minimum) * 100
+    return np.clip(score, 0, 100)
+
+
+@instr.instrumenter(st.cache_data, categorie="ml")
+def calculer_tension_immobiliere(data, persister=True):
     """
     Score de tension robuste basé sur :
     - Standardisation
@@ -163,34 +401,166 @@ def calculer_tension_immobiliere(data):
         - Résidences secondaires (%)
         - Propriétaires (%)
 
-    Retourne DF avec Score_Tension et Niveau.
+    Le scaler, la PCA et les bornes du score sont repris du registre
+    s'ils ont été ajustés sur les mêmes données (persister=True).
+
+    Retourne les identifiants de data avec Score_Tension et Niveau
+    (colonnes résultat seulement, à joindre sur insee_com).
     """
 
-    df = data.copy().fillna(0)
-    variables = ["Plog_VAC", "Plog_RS", "Prp_RP_PROP"]
+    variables = VARIABLES_TENSION
+    identifiants = _identifiants(data)
+    df = _remplir_numeriques(data, identifiants + variables)
 
-    X = df[variables]
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    X = df[variables].to_numpy()  # dtype du data store (float32) conservé
+    parametres = {"variables": variables}
+    empreinte = registre.empreinte(X, parametres)
+    artefact = registre.charger("tension", empreinte) if persister else None
+
+    if artefact is None:
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+
+        # PCA pour pondération objective
+        pca = PCA(n_components=1)
+        composante = pca.fit_transform(X_scaled).flatten()
 
-    # PCA pour pondération objective
-    pca = PCA(n_components=1)
-    composante = pca.fit_transform(X_scaled).flatten()
+        artefact = {
+            "objets": {"scaler": scaler, "pca": pca, "bornes": (composante.min(), composante.max())},
+            "etapes": ["scaler", "pca"],
+        }
+        if persister:
+            registre.sauver("tension", artefact["objets"], empreinte, parametres, etapes=artefact["etapes"])
 
     # Normalisation en score 0-100
-    score = (composante - composante.min()) / (composante.max() - composante.min())
-    score = score * 100
+    df["Score_Tension"] = _score_tension(artefact, X).round(1)
+    df["Niveau"] = _niveau_tension(df["Score_Tension"])
 
-    df["Score_Tension"] = score.round(1)
+    return df[identifiants + ["Score_Tension", "Niveau"]]
 
-    df["Niveau"] = pd.cut(
-        df["Score_Tension"],
-        bins=[0, 25, 50, 75, 100],
-        labels=["🟢 Faible", "🟡 Modérée", "🟠 Élevée", "🔴 Très élevée"],
-        include_lowest=True
-    )
 
-    return df
+# =================================================================
+# 🔵 2bis) PRÉDICTION AVEC LES MODÈLES ENREGISTRÉS
+# =================================================================
+# Nouvelles communes ou communes mises à jour : le modèle courant du
+# registre est appliqué tel quel, les identifiants de profils restent stables.
+
+def predire_profils(data, empreinte=None):
+    """Identifiants et Profil de chaque ligne avec le KMeans enregistré."""
+    artefact = registre.charger("profils", empreinte)
+    if artefact is None:
+        raise FileNotFoundError("Aucun modèle de profils enregistré : lancer identifier_profils_communes.")
+
+    identifiants = _identifiants(data)
+    df = _ajouter_parts_logement(_remplir_numeriques(data, identifiants + COLONNES_SOURCE_PROFILS))
+    df["Profil"] = registre.appliquer(artefact, df[artefact["parametres"]["variables"]].to_numpy(dtype=float))
+    return df[identifiants + ["Profil"]]
+
+
+def predire_tension(data, empreinte=None):
+    """Score_Tension et Niveau avec le modèle de tension figé enregistré (sans réajustement)."""
+    artefact = registre.charger(MODELE_TENSION_FIGEE, empreinte)
+    if artefact is None:
+        raise FileNotFoundError("Aucun modèle de tension figé enregistré : lancer figer_tension.")
+
+    return scorer_tension(data, artefact)
+
+
+# =================================================================
+# 🔵 2ter) SCORE DE TENSION À RÉFÉRENCE FIXE (mises à jour incrémentales)
+# =================================================================
+# Le scaler, la PCA et les bornes 0-100 sont figés sur une année de
+# référence : une commune ajoutée ou un nouveau millésime INSEE ne
+# déplace plus le score des autres communes, seules les lignes
+# nouvelles ou modifiées sont notées.
+
+ANNEE_REFERENCE_TENSION = 2022
+
+# Nom du modèle figé dans le registre, distinct de "tension" (réajusté sur
+# toutes les lignes par calculer_tension_immobiliere)
+MODELE_TENSION_FIGEE = "tension_figee"
+
+COLONNES_TENSION = ["insee_com", "DEP", "AN", "Score_Tension", "Niveau"]
+
+
+def figer_tension(annee_reference=ANNEE_REFERENCE_TENSION, data=None, persister=True,
+                  racine=store.RACINE_PARQUET):
+    """
+    Ajuste le scaler, la PCA et les bornes du score sur l'année de
+    référence (lue dans le data store si data est None) et en fait le
+    modèle de tension figé courant du registre. Retourne l'artefact.
+    """
+    if data is None:
+        data = store.lire_table(store.TABLE_COMMUNES, colonnes=["AN"] + VARIABLES_TENSION,
+                                filtres={"AN": annee_reference}, racine=racine)
+    else:
+        data = data[data["AN"] == annee_reference]
+    if data.empty:
+        raise ValueError(f"Aucune ligne pour l'année de référence {annee_reference}")
+
+    X = _remplir_numeriques(data, VARIABLES_TENSION).to_numpy()
+    parametres = {"variables": VARIABLES_TENSION, "annee_reference": int(annee_reference)}
+    empreinte = registre.empreinte(X, parametres)
+    artefact = registre.charger(MODELE_TENSION_FIGEE, empreinte) if persister else None
+
+    if artefact is None:
+        scaler = StandardScaler()
+        pca = PCA(n_components=1)
+        composante = pca.fit_transform(scaler.fit_transform(X)).flatten()
+        artefact = {
+            "objets": {"scaler": scaler, "pca": pca, "bornes": (composante.min(), composante.max())},
+            "etapes": ["scaler", "pca"],
+            "parametres": parametres,
+            "empreinte": empreinte,
+        }
+        if persister:
+            registre.sauver(MODELE_TENSION_FIGEE, artefact["objets"], empreinte, parametres,
+                            etapes=artefact["etapes"])
+
+    return artefact
+
+
+def scorer_tension(data, artefact):
+    """Identifiants, Score_Tension et Niveau de chaque ligne avec un modèle figé (aucun réajustement)."""
+    identifiants = _identifiants(data)
+    variables = artefact["parametres"]["variables"]
+    df = _remplir_numeriques(data, identifiants + variables)
+    df["Score_Tension"] = _score_tension(artefact, df[variables].to_numpy()).round(1)
+    df["Niveau"] = _niveau_tension(df["Score_Tension"])
+    return df[identifiants + ["Score_Tension", "Niveau"]]
+
+
+def tension_par_annee(annees=None, existants=None, artefact=None, racine=store.RACINE_PARQUET):
+    """
+    Scores de tension de plusieurs millésimes, lus année par année dans le
+    data store avec le modèle figé (courant du registre si artefact est None).
+    - annees    : années à (re)noter ; None = toutes les années du store
+    - existants : scores déjà calculés (COLONNES_TENSION) ; seules les
+      années absentes de existants ou listées dans annees sont notées,
+      les autres lignes sont reprises telles quelles.
+    Retourne un DataFrame COLONNES_TENSION trié par AN puis insee_com.
+    """
+    if artefact is None:
+        artefact = registre.charger(MODELE_TENSION_FIGEE)
+        if artefact is None:
+            artefact = figer_tension(racine=racine)
+
+    disponibles = store.annees_disponibles(store.TABLE_COMMUNES, racine)
+    if annees is None:
+        deja = set() if existants is None else set(existants["AN"].astype(int))
+        a_noter = [an for an in disponibles if an not in deja]
+    else:
+        a_noter = [int(an) for an in annees]
+
+    colonnes = ["insee_com", "DEP", "AN"] + artefact["parametres"]["variables"]
+    morceaux = [] if existants is None else [existants[~existants["AN"].astype(int).isin(a_noter)]]
+    for an in a_noter:
+        lignes = store.lire_table(store.TABLE_COMMUNES, colonnes=colonnes, filtres={"AN": an}, racine=racine)
+        morceaux.append(scorer_tension(lignes, artefact)[COLONNES_TENSION])
+
+    scores = pd.concat(morceaux, ignore_index=True) if morceaux else pd.DataFrame(columns=COLONNES_TENSION)
+    scores["Niveau"] = pd.Categorical(scores["Niveau"], categories=NIVEAUX_TENSION)
+    return scores.sort_values(["AN", "insee_com"], kind="stable").reset_index(drop=True)
 
 
 # =================================================================
@@ -202,7 +572,7 @@ def _exp_model(x, a, b):
     return a * np.exp(b * x)
 
 
-@st.cache_data
+@instr.instrumenter(st.cache_data, categorie="ml")
 def predire_evolution_logements(data, commune, annees_futures=3):
     """
     Prédit le nombre de logements d'une commune via :
@@ -220,7 +590,7 @@ def predire_evolution_logements(data, commune, annees_futures=3):
         return None, None
 
     X = df["AN"].values
-    y = df["LOG"].values
+    y = df["LOG"].to_numpy(dtype=float)
     X_reshape = X.reshape(-1, 1)
 
     # -------------------------
@@ -0,0 +1,149 @@
+# ================================================================
+# 🗃️ REGISTRE DES MODÈLES — Scaler / KMeans / PCA persistés et versionnés
+# ================================================================
+# Ce module regroupe :
+# 1. Empreinte d'un jeu d'entraînement (données + paramètres + version sklearn)
+# 2. Sauvegarde / chargement des objets ajustés (joblib, écriture atomique)
+# 3. Prédiction avec le modèle courant (nouvelles communes, mises à jour)
+# ================================================================
+# Arborescence : <dossier>/<nom>/<empreinte>.joblib
+#                <dossier>/<nom>/courant.json  (version servie par défaut)
+# Le dossier peut être partagé entre réplicas via OPENDATA_MODELES.
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import sklearn
+
+
+DOSSIER_MODELES = os.environ.get("OPENDATA_MODELES", "SORTIE/modeles")
+
+FICHIER_COURANT = "courant.json"
+
+
+# =================================================================
+# 🔵 1) EMPREINTE
+# =================================================================
+
+def empreinte(X, parametres):
+    """
+    sha256 de la matrice d'entraînement (valeurs et forme), des paramètres
+    et de la version de scikit-learn : deux réplicas qui voient les mêmes
+    données obtiennent la même empreinte, donc le même modèle.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    h = hashlib.sha256()
+    h.update(str(X.shape).encode())
+    h.update(X.tobytes())
+    h.update(json.dumps(parametres, sort_keys=True, default=str).encode())
+    h.update(sklearn.__version__.encode())
+    return h.hexdigest()[:16]
+
+
+# =================================================================
+# 🔵 2) SAUVEGARDE / CHARGEMENT
+# =================================================================
+
+def _dossier(nom, dossier):
+    return Path(dossier) / nom
+
+
+def _ecrire_atomique(chemin, ecrire):
+    """Écrit dans un fichier temporaire puis le renomme (pas de lecture d'un fichier à moitié écrit)."""
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=chemin.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        ecrire(tmp)
+        os.replace(tmp, chemin)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def sauver(nom, objets, empreinte_donnees, parametres, etapes, dossier=DOSSIER_MODELES):
+    """
+    Enregistre les objets ajustés (dict {étape: objet sklearn}) sous
+    <nom>/<empreinte>.joblib et en fait la version courante.
+    `etapes` : ordre d'application pour predire (ex. ["scaler", "kmeans"]).
+    """
+    artefact = {
+        "objets": objets,
+        "etapes": list(etapes),
+        "parametres": parametres,
+        "empreinte": empreinte_donnees,
+        "sklearn": sklearn.__version__,
+        "cree_le": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    chemin = _dossier(nom, dossier) / f"{empreinte_donnees}.joblib"
+    _ecrire_atomique(chemin, lambda tmp: joblib.dump(artefact, tmp))
+
+    courant = {k: v for k, v in artefact.items() if k != "objets"}
+    courant["fichier"] = chemin.name
+    _ecrire_atomique(
+        _dossier(nom, dossier) / FICHIER_COURANT,
+        lambda tmp: Path(tmp).write_text(json.dumps(courant, indent=1, ensure_ascii=False), encoding="utf-8"),
+    )
+    return chemin
+
+
+def charger(nom, empreinte_donnees=None, dossier=DOSSIER_MODELES):
+    """
+    Artefact du modèle `nom` : la version `empreinte_donnees`, ou la version
+    courante si None. Retourne None si absent ou ajusté avec une autre
+    version de scikit-learn.
+    """
+    if empreinte_donnees is None:
+        chemin_courant = _dossier(nom, dossier) / FICHIER_COURANT
+        if not chemin_courant.exists():
+            return None
+        empreinte_donnees = json.loads(chemin_courant.read_text(encoding="utf-8"))["empreinte"]
+
+    chemin = _dossier(nom, dossier) / f"{empreinte_donnees}.joblib"
+    if not chemin.exists():
+        return None
+
+    artefact = joblib.load(chemin)
+    if artefact.get("sklearn") != sklearn.__version__:
+        return None
+    return artefact
+
+
+def versions(nom, dossier=DOSSIER_MODELES):
+    """Empreintes disponibles pour `nom` (de la plus ancienne à la plus récente)."""
+    chemins = sorted(_dossier(nom, dossier).glob("*.joblib"), key=lambda c: c.stat().st_mtime)
+    return [c.stem for c in chemins]
+
+
+# =================================================================
+# 🔵 3) PRÉDICTION
+# =================================================================
+
+def appliquer(artefact, X):
+    """
+    Applique les étapes de l'artefact : transform pour toutes sauf la
+    dernière, puis predict (KMeans) ou transform (PCA) pour la dernière.
+    """
+    objets, etapes = artefact["objets"], artefact["etapes"]
+    for etape in etapes[:-1]:
+        X = objets[etape].transform(X)
+    dernier = objets[etapes[-1]]
+    return dernier.predict(X) if hasattr(dernier, "predict") else dernier.transform(X)
+
+
+def predire(nom, X, empreinte_donnees=None, dossier=DOSSIER_MODELES):
+    """
+    Prédiction du modèle `nom` (version courante par défaut) pour de
+    nouvelles lignes, sans réajustement. Lève FileNotFoundError si aucun
+    modèle n'a encore été enregistré.
+    """
+    artefact = charger(nom, empreinte_donnees, dossier)
+    if artefact is None:
+        raise FileNotFoundError(f"Aucun modèle « {nom} » enregistré dans {dossier}")
+    return appliquer(artefact, X)
@@ -0,0 +1,417 @@
+# ================================================================
+# 🏭 PIPELINE ETL — Compilation incrémentale des bases logement
+# ================================================================
+# Version script des notebooks 1_compilation et 2_tableaux :
+# 1. Empreinte de chaque classeur source (taille / mtime / sha256)
+# 2. Cache colonnaire (Parquet) de chaque année déjà lue
+# 3. Relecture des seules années dont la source a changé, en parallèle
+#    (pool de processus, filtre départemental appliqué dans chaque worker)
+#    et en flux : les lignes hors DEP / zone sont écartées pendant la lecture
+# 4. Reconstruction de la table large « communes » (les tableaux longs
+#    des graphiques en sont dérivés à la demande, cf. data_store.vue_longue)
+# 5. Contours des communes en GeoParquet WGS84 (cf. geometries.py),
+#    régénérés seulement quand le GeoJSON source change
+# 6. Précalcul des profils, scores de tension et prévisions (cf. precalcul.py) :
+#    l'application ne fait plus que lire ces tables
+#
+# lanceur : python pipeline.py --dep 30 34
+# ================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import data_store as store
+import geometries as geo
+import precalcul
+
+
+# -----------------------------------------------
+# Paramètres par défaut (identiques aux notebooks)
+# -----------------------------------------------
+
+DOSSIER_DATA = "DATA"
+DOSSIER_CACHE = "SORTIE/cache"
+DEP_FILTRE = ["30", "34"]
+ZONE = "LIBGEO"   # zone d'agrégation
+ZONE_F = []       # filtres éventuels sur la zone
+MODE_LECTURE = "flux"
+
+# Identifiants toujours conservés lors d'une sélection de colonnes
+COLONNES_ID = ["CODGEO", "REG", "DEP", "LIBGEO"]
+
+# Fichier source et feuille par année (relatifs à DOSSIER_DATA)
+FICHIERS = {
+    2022: ("base-cc-logement-2022.xlsx", "COM_2022"),
+    2021: ("base-cc-logement-2021.xlsx", "COM_2021"),
+    2020: ("base-cc-logement-2020.xlsx", "COM_2020"),
+    2019: ("base-cc-logement-2019.xlsx", "COM_2019"),
+    2018: ("base-cc-logement-2018.xlsx", "COM_2018"),
+    2017: ("base-cc-logement-2017.xlsx", "COM_2017"),
+    2016: ("base-cc-logement-2016.xls", "COM_2016"),
+    2015: ("base-cc-logement-2015.xls", "COM_2015"),
+    2014: ("base-cc-logement-2020.xlsx", "COM_2014"),
+    2013: ("base-cc-logement-2019.xlsx", "COM_2013"),
+}
+
+LIGNES_ENTETE = 5  # lignes de titre INSEE avant l'en-tête des colonnes
+
+NOM_MANIFESTE = "manifeste.json"
+
+
+# =================================================================
+# 🔵 1) EMPREINTES ET MANIFESTE
+# =================================================================
+
+def _sha256(chemin, taille_bloc=1 << 20):
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(taille_bloc), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def empreinte_fichier(chemin, precedente=None):
+    """
+    Empreinte d'un fichier source : taille, mtime et sha256.
+    Si la taille et le mtime n'ont pas bougé depuis l'empreinte
+    précédente, le hash est repris sans relire le fichier.
+    """
+    stat = os.stat(chemin)
+    empreinte = {"taille": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    if (
+        precedente
+        and precedente.get("taille") == empreinte["taille"]
+        and precedente.get("mtime") == empreinte["mtime"]
+    ):
+        empreinte["sha256"] = precedente["sha256"]
+    else:
+        empreinte["sha256"] = _sha256(chemin)
+
+    return empreinte
+
+
+def charger_manifeste(dossier_cache):
+    chemin = Path(dossier_cache) / NOM_MANIFESTE
+    if not chemin.exists():
+        return {}
+    with open(chemin, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sauver_manifeste(manifeste, dossier_cache):
+    chemin = Path(dossier_cache) / NOM_MANIFESTE
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(manifeste, f, indent=1, ensure_ascii=False)
+
+
+# =================================================================
+# 🔵 2) LECTURE DES CLASSEURS (avec cache par année)
+# =================================================================
+
+def charger_fichier_logement(fichier, sheet, annee, skip=LIGNES_ENTETE, usecols=None):
+    # Identifiants lus en texte : "01" / "01001" gardent leur zéro initial,
+    # comme en lecture en flux (sans quoi --dep 01 ne retient aucune ligne)
+    dtype = {col: str for col in COLONNES_ID}
+    df = pd.read_excel(fichier, sheet_name=sheet, skiprows=skip, usecols=usecols, dtype=dtype)
+    df["AN"] = annee
+    return df
+
+
+def options_lecture(dep_filtre=DEP_FILTRE, zone_f=ZONE_F, colonnes=None, mode=MODE_LECTURE):
+    """
+    Options de lecture d'une année :
+    - dep      : départements conservés (liste vide = tous)
+    - zone_f   : valeurs de la colonne ZONE conservées (liste vide = toutes)
+    - colonnes : variables conservées en plus des identifiants (None = toutes)
+    - mode     : "flux" (openpyxl ligne à ligne) ou "complet" (pd.read_excel)
+    """
+    return {
+        "dep": sorted(str(d) for d in dep_filtre or []),
+        "zone_f": sorted(zone_f or []),
+        "colonnes": sorted(colonnes) if colonnes else None,
+        "mode": mode,
+    }
+
+
+def _colonne_gardee(nom, colonnes):
+    return colonnes is None or nom in COLONNES_ID or nom in colonnes
+
+
+def filtrer_lignes(df, dep_filtre=None, zone_f=None):
+    """Ne garde que les communes des départements / zones demandés (liste vide = tous)."""
+    if dep_filtre:
+        df = df[df["DEP"].astype(str).isin(dep_filtre)]
+    if zone_f:
+        df = df[df[ZONE].isin(zone_f)]
+    return df.reset_index(drop=True)
+
+
+def lire_feuille_en_flux(fichier, sheet, annee, skip=LIGNES_ENTETE,
+                         dep_filtre=None, zone_f=None, colonnes=None):
+    """
+    Lecture d'une feuille .xlsx ligne à ligne (openpyxl en lecture seule).
+    Les filtres DEP / zone et la sélection de colonnes sont appliqués à
+    chaque ligne : seules les lignes retenues sont gardées en mémoire.
+    """
+    prefixe = f"P{str(annee)[-2:]}_"
+    deps = set(dep_filtre) if dep_filtre else None
+    zones = set(zone_f) if zone_f else None
+
+    classeur = openpyxl.load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        lignes = classeur[sheet].iter_rows(min_row=skip + 1, values_only=True)
+        entete = [None if c is None else str(c).replace(prefixe, "") for c in next(lignes)]
+        gardees = [i for i, nom in enumerate(entete) if nom is not None and _colonne_gardee(nom, colonnes)]
+        i_dep = entete.index("DEP")
+        i_zone = entete.index(ZONE) if zones else None
+
+        retenues = []
+        for ligne in lignes:
+            if all(v is None for v in ligne):
+                continue
+            if deps is not None and str(ligne[i_dep]) not in deps:
+                continue
+            if zones is not None and ligne[i_zone] not in zones:
+                continue
+            retenues.append([ligne[i] for i in gardees])
+    finally:
+        classeur.close()
+
+    df = pd.DataFrame(retenues, columns=[entete[i] for i in gardees]).infer_objects()
+    df["AN"] = annee
+    return df
+
+
+def parser_annee(fichier, sheet, annee, skip=LIGNES_ENTETE, lecture=None):
+    """
+    Lit une année, retire le préfixe P{yy}_ des colonnes, filtre les
+    départements / zones et sélectionne les colonnes. Le mode "flux"
+    s'applique aux .xlsx ; les anciens .xls passent par pd.read_excel.
+    """
+    lecture = lecture or options_lecture()
+    dep_filtre, zone_f, colonnes = lecture["dep"], lecture["zone_f"], lecture["colonnes"]
+    prefixe = f"P{str(annee)[-2:]}_"
+
+    if lecture["mode"] == "flux" and Path(fichier).suffix.lower() in (".xlsx", ".xlsm"):
+        df = lire_feuille_en_flux(fichier, sheet, annee, skip, dep_filtre, zone_f, colonnes)
+    else:
+        usecols = None
+        if colonnes is not None:
+            usecols = lambda nom: _colonne_gardee(str(nom).replace(prefixe, ""), colonnes)
+        df = charger_fichier_logement(fichier, sheet, annee, skip, usecols=usecols)
+        df.columns = df.columns.str.replace(prefixe, "", regex=False)
+        df = filtrer_lignes(df, dep_filtre, zone_f)
+
+    # Colonnes texte homogènes pour l'écriture Parquet (codes parfois lus en nombre)
+    for col in df.select_dtypes(include="object").columns:
+        df[col] = df[col].astype(str)
+    return df
+
+
+def _chemin_cache(dossier_cache, annee):
+    return Path(dossier_cache) / "annees" / f"AN={annee}.parquet"
+
+
+def _a_jour(entree, empreinte, parametres, chemin_cache):
+    return (
+        entree is not None
+        and entree.get("sha256") == empreinte["sha256"]
+        and entree.get("parametres") == parametres
+        and chemin_cache.exists()
+    )
+
+
+def _traiter_annee(annee, source, sheet, lecture, chemin_cache):
+    """
+    Tâche d'un worker : lecture + nettoyage + filtre d'une année, puis
+    écriture du cache. Seules les lignes filtrées repartent vers le parent.
+    """
+    df = parser_annee(source, sheet, annee, lecture=lecture)
+    chemin_cache.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(chemin_cache, index=False)
+    return annee, df
+
+
+def charger_annees(fichiers=FICHIERS, dossier_data=DOSSIER_DATA,
+                   dossier_cache=DOSSIER_CACHE, lecture=None,
+                   forcer=False, n_workers=None):
+    """
+    Retourne {annee: DataFrame filtré} en relisant uniquement les classeurs
+    modifiés depuis le dernier passage ; les autres années viennent du
+    cache Parquet. Les années à relire sont traitées en parallèle dans un
+    pool de n_workers processus (None = nombre de cœurs, 1 = en série).
+    Retourne aussi la liste des années relues.
+    """
+    lecture = lecture or options_lecture()
+    manifeste = charger_manifeste(dossier_cache)
+    bases, a_relire, nouvelles_entrees = {}, [], {}
+
+    for annee, (fichier, sheet) in fichiers.items():
+        source = Path(dossier_data) / fichier
+        cle = str(annee)
+        entree = manifeste.get(cle)
+        empreinte = empreinte_fichier(source, entree)
+        # le mode de lecture ne change pas le résultat (identifiants lus en texte
+        # dans les deux cas) : hors de la clé de cache
+        parametres = {"fichier": fichier, "feuille": sheet, "skip": LIGNES_ENTETE,
+                      **{k: v for k, v in lecture.items() if k != "mode"}}
+        chemin_cache = _chemin_cache(dossier_cache, annee)
+
+        if not forcer and _a_jour(entree, empreinte, parametres, chemin_cache):
+            bases[annee] = pd.read_parquet(chemin_cache)
+            manifeste[cle] = {**entree, **empreinte}
+            continue
+
+        a_relire.append((annee, source, sheet, lecture, chemin_cache))
+        nouvelles_entrees[cle] = {**empreinte, "parametres": parametres}
+
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(a_relire), 1))
+    if n_workers <= 1:
+        resultats = [_traiter_annee(*tache) for tache in a_relire]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(_traiter_annee, *tache) for tache in a_relire]
+            resultats = [future.result() for future in as_completed(futures)]
+
+    for annee, df in resultats:
+        bases[annee] = df
+        manifeste[str(annee)] = nouvelles_entrees[str(annee)]
+
+    sauver_manifeste(manifeste, dossier_cache)
+    relues = sorted(annee for annee, _ in resultats)
+    return dict(sorted(bases.items(), reverse=True)), relues
+
+
+# =================================================================
+# 🔵 3) COMPILATION (notebook 1_compilation)
+# =================================================================
+
+def compiler_bases(bases):
+    """Fusion des années (déjà filtrées à la lecture) et variables calculées."""
+    histo_log = pd.concat(bases.values(), ignore_index=True)
+
+    # Nombre de résidences principales en logements locatifs privés
+    histo_log = histo_log.assign(RP_LOCPRIV=lambda x: x["RP"] - x["RP_LOCHLMV"])
+
+    # Arrondir les variables numériques à l'entier le plus proche
+    variables_numeriques = histo_log.select_dtypes(include=[np.number]).columns
+    histo_log[variables_numeriques] = histo_log[variables_numeriques].round(0).astype("Int64")
+
+    histo_log = histo_log.assign(
+        Plog_RP=round(100 * histo_log["RP"] / histo_log["LOG"], 1),
+        Plog_RS=round(100 * histo_log["RSECOCC"] / histo_log["LOG"], 1),
+        Plog_VAC=round(100 * histo_log["LOGVAC"] / histo_log["LOG"], 1),
+        Plog_RP_LOCHLM=round(100 * histo_log["RP_LOCHLMV"] / histo_log["LOG"], 1),
+        Plog_RP_LOCPRIV=round(100 * histo_log["RP_LOCPRIV"] / histo_log["LOG"], 1),
+        Plog_RP_LOC=round(100 * histo_log["RP_LOC"] / histo_log["LOG"], 1),
+        Plog_RP_PROP=round(100 * histo_log["RP_PROP"] / histo_log["LOG"], 1),
+        Plog_RP_GRAT=round(100 * histo_log["RP_GRAT"] / histo_log["LOG"], 1),
+
+        Prp_RP_LOCHLM=round(100 * histo_log["RP_LOCHLMV"] / histo_log["RP"], 1),
+        Prp_RP_LOCPRIV=round(100 * histo_log["RP_LOCPRIV"] / histo_log["RP"], 1),
+        Prp_RP_LOC=round(100 * histo_log["RP_LOC"] / histo_log["RP"], 1),
+        Prp_RP_PROP=round(100 * histo_log["RP_PROP"] / histo_log["RP"], 1),
+        Prp_RP_GRAT=round(100 * histo_log["RP_GRAT"] / histo_log["RP"], 1),
+    )
+
+    histo_log = histo_log.loc[:, ~histo_log.columns.str.startswith(("C1", "C2"))]
+
+    return histo_log.reset_index(drop=True)
+
+
+# =================================================================
+# 🔵 4) CONTOURS (GeoParquet pour l'application)
+# =================================================================
+
+def preparer_geometries(source=geo.SOURCE_GEOJSON, dossier=geo.DOSSIER_GEOMETRIES,
+                        dossier_cache=DOSSIER_CACHE, forcer=False):
+    """
+    Régénère les fichiers de geometries.py si le GeoJSON source a changé
+    depuis le dernier passage (même manifeste que les classeurs).
+    Retourne True si les contours ont été réécrits.
+    """
+    manifeste = charger_manifeste(dossier_cache)
+    entree = manifeste.get("geometries")
+    empreinte = empreinte_fichier(source, entree)
+    parametres = {"source": str(source), "niveaux": geo.NIVEAUX}
+    a_jour = all(geo.chemin_niveau(niveau, dossier).exists() for niveau in geo.NIVEAUX)
+
+    if not forcer and a_jour and entree is not None \
+            and entree.get("sha256") == empreinte["sha256"] and entree.get("parametres") == parametres:
+        manifeste["geometries"] = {**entree, **empreinte}
+        sauver_manifeste(manifeste, dossier_cache)
+        return False
+
+    geo.construire_niveaux(source, dossier)
+    manifeste["geometries"] = {**empreinte, "parametres": parametres}
+    sauver_manifeste(manifeste, dossier_cache)
+    return True
+
+
+# =================================================================
+# 🔵 5) ORCHESTRATION + LIGNE DE COMMANDE
+# =================================================================
+
+def executer(dossier_data=DOSSIER_DATA, racine=store.RACINE_PARQUET,
+             dossier_cache=DOSSIER_CACHE, lecture=None, forcer=False,
+             n_workers=None, source_geo=geo.SOURCE_GEOJSON,
+             dossier_geo=geo.DOSSIER_GEOMETRIES, etapes_precalcul=precalcul.ETAPES):
+    debut = time.perf_counter()
+
+    bases, relues = charger_annees(FICHIERS, dossier_data, dossier_cache, lecture, forcer, n_workers)
+    print(f"Années relues : {relues or 'aucune'} ({len(bases) - len(relues)} depuis le cache)")
+
+    compil = compiler_bases(bases).rename(columns={"CODGEO": "insee_com"})
+    store.ecrire_table(compil, store.TABLE_COMMUNES, racine=racine)
+
+    print(f"{len(compil)} lignes compilées en {time.perf_counter() - debut:.1f} s → {racine}")
+
+    if source_geo:
+        reecrits = preparer_geometries(source_geo, dossier_geo, dossier_cache, forcer)
+        print(f"Contours : {'régénérés' if reecrits else 'à jour'} → {dossier_geo}")
+
+    # Tension : seules les années relues sont renotées (toutes si --forcer)
+    precalcul.executer(racine, None if forcer else relues, etapes_precalcul, n_workers)
+    return compil
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compilation incrémentale des bases CC logement.")
+    parser.add_argument("--data", default=DOSSIER_DATA, help="dossier des classeurs INSEE")
+    parser.add_argument("--sortie", default=store.RACINE_PARQUET, help="racine du dataset Parquet")
+    parser.add_argument("--cache", default=DOSSIER_CACHE, help="dossier du cache par année")
+    parser.add_argument("--dep", nargs="*", default=DEP_FILTRE, help="départements conservés (vide = tous)")
+    parser.add_argument("--zone-f", nargs="*", default=ZONE_F, help=f"valeurs de {ZONE} conservées (vide = toutes)")
+    parser.add_argument("--colonnes", nargs="*", default=None,
+                        help="variables conservées en plus des identifiants (défaut : toutes)")
+    parser.add_argument("--lecture", choices=["flux", "complet"], default=MODE_LECTURE,
+                        help="flux : openpyxl ligne à ligne avec filtres ; complet : pd.read_excel")
+    parser.add_argument("--geojson", default=geo.SOURCE_GEOJSON,
+                        help="GeoJSON des contours communaux (vide = étape ignorée)")
+    parser.add_argument("--geometries", default=geo.DOSSIER_GEOMETRIES,
+                        help="dossier des contours GeoParquet par niveau de détail")
+    parser.add_argument("--precalcul", nargs="*", choices=precalcul.ETAPES, default=precalcul.ETAPES,
+                        help="résultats ML précalculés après la compilation (vide = aucun)")
+    parser.add_argument("--forcer", action="store_true", help="relire toutes les années")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processus de lecture en parallèle (défaut : nombre de cœurs)")
+    args = parser.parse_args(argv)
+
+    lecture = options_lecture(args.dep, args.zone_f, args.colonnes, args.lecture)
+    executer(args.data, args.sortie, args.cache, lecture, args.forcer, args.workers,
+             args.geojson, args.geometries, args.precalcul)
+
+
+if __name__ == "__main__":
+    main()
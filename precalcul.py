@@ -0,0 +1,143 @@
+# ================================================================
+# 🧮 PRÉCALCUL — Résultats ML écrits dans le data store
+# ================================================================
+# Ce module regroupe :
+# 1. Profils de communes (KMeans) de l'année de la carte + descriptions
+# 2. Scores de tension de tous les millésimes (référence figée, cf.
+#    ml.figer_tension), seules les années relues sont renotées
+# 3. Prévisions du parc (cf. previsions.py)
+# 4. Lecture par l'application (aucun ajustement pendant une requête)
+# ================================================================
+# lanceur : python precalcul.py
+#           (aussi appelé par pipeline.py après l'écriture de la table communes)
+
+import argparse
+import time
+from pathlib import Path
+
+import data_store as store
+import index_communes as idx
+import ml_models as ml
+import previsions as prev
+
+
+TABLE_PROFILS = "profils"
+TABLE_TENSION = "tension"
+
+ANNEE_PROFILS = 2022   # année de la carte des profils
+K_PROFILS = 3          # k maximal des profils affichés dans l'application
+
+ETAPES = ["profils", "tension", "previsions"]
+
+COLONNES_PROFILS = ["insee_com", "DEP", "AN", "LIBGEO"] + ml.VARIABLES_PROFILS + ["Profil", "Nom_Profil"]
+
+
+# =================================================================
+# 🔵 1) PROFILS DE COMMUNES
+# =================================================================
+
+def precalculer_profils(racine=store.RACINE_PARQUET, annee=ANNEE_PROFILS, k_max=K_PROFILS):
+    """
+    Profils des communes de `annee` (scaler / KMeans repris du registre si
+    déjà ajustés sur ces données) écrits dans la table profils ; les
+    descriptions (nom, insights) sont jointes en métadonnées de la table,
+    avec l'empreinte de la table communes dont les profils sont issus.
+    """
+    communes = store.lire_table(store.TABLE_COMMUNES, filtres={"AN": annee}, racine=racine)
+    # Hors de Streamlit : fonction d'origine, sans le cache (ni hachage de la table)
+    profils, descriptions = ml.identifier_profils_communes.__wrapped__(idx.trier_par_commune(communes), k_max)
+
+    store.ecrire_table(profils[COLONNES_PROFILS], TABLE_PROFILS, racine=racine)
+    store.ecrire_metadonnees(
+        {"annee": int(annee), "k_max": int(k_max),
+         "source": store.empreinte_table(store.TABLE_COMMUNES, racine),
+         "descriptions": {str(profil): info for profil, info in descriptions.items()}},
+        TABLE_PROFILS, racine=racine,
+    )
+    return profils, descriptions
+
+
+# =================================================================
+# 🔵 2) SCORES DE TENSION
+# =================================================================
+
+def precalculer_tension(racine=store.RACINE_PARQUET, annees=None):
+    """
+    Scores de tension de tous les millésimes avec le modèle figé.
+    annees : années à renoter (ex. les années relues par le pipeline) ;
+    None = toutes. Les années absentes de la table sont toujours notées,
+    les lignes des autres années sont reprises telles quelles.
+    """
+    existants, a_noter = None, None
+    if annees is not None and (Path(racine) / TABLE_TENSION).exists():
+        disponibles = store.annees_disponibles(racine=racine)
+        existants = store.lire_table(TABLE_TENSION, racine=racine)
+        existants = existants[existants["AN"].isin(disponibles)]
+        a_noter = sorted(set(annees) | (set(disponibles) - set(existants["AN"].astype(int))))
+
+    scores = ml.tension_par_annee(a_noter, existants, racine=racine)
+    store.ecrire_table(scores, TABLE_TENSION, racine=racine)
+    return scores
+
+
+# =================================================================
+# 🔵 3) ORCHESTRATION + LIGNE DE COMMANDE
+# =================================================================
+
+def executer(racine=store.RACINE_PARQUET, annees_modifiees=None, etapes=ETAPES, n_workers=None):
+    """
+    Lance les étapes de précalcul sur le dataset `racine`.
+    annees_modifiees : années de la table communes relues depuis le
+    dernier passage, seules renotées pour la tension (None = toutes).
+    """
+    for etape in etapes:
+        debut = time.perf_counter()
+        if etape == "profils":
+            _, descriptions = precalculer_profils(racine)
+            detail = f"{len(descriptions)} profils"
+        elif etape == "tension":
+            scores = precalculer_tension(racine, annees_modifiees)
+            detail = f"{len(scores)} scores"
+        elif etape == "previsions":
+            previsions, _ = prev.executer(racine, n_workers=n_workers)
+            detail = f"{len(previsions)} prévisions"
+        else:
+            raise ValueError(f"Étape de précalcul inconnue : {etape} (attendu : {ETAPES})")
+        print(f"Précalcul {etape} : {detail} en {time.perf_counter() - debut:.1f} s")
+
+
+# =================================================================
+# 🔵 4) LECTURE PAR L'APPLICATION
+# =================================================================
+
+def lire_profils(annee=ANNEE_PROFILS, racine=store.RACINE_PARQUET):
+    """
+    (profils triés par code commune, descriptions {profil: {nom, insights}})
+    de la table précalculée, ou None si l'étape n'a pas été lancée pour `annee`
+    ou si la table communes a été réécrite depuis (profils à recalculer).
+    """
+    meta = store.lire_metadonnees(TABLE_PROFILS, racine=racine)
+    if meta is None or meta.get("annee") != annee:
+        return None
+    if meta.get("source") != store.empreinte_table(store.TABLE_COMMUNES, racine):
+        return None
+
+    profils = idx.trier_par_commune(store.lire_table(TABLE_PROFILS, filtres={"AN": annee}, racine=racine))
+    profils["Profil"] = profils["Profil"].astype(int)
+    profils["Nom_Profil"] = profils["Nom_Profil"].astype(str)
+    descriptions = {int(profil): info for profil, info in meta["descriptions"].items()}
+    return profils, descriptions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Précalcul des profils, scores de tension et prévisions.")
+    parser.add_argument("--sortie", default=store.RACINE_PARQUET, help="racine du dataset Parquet")
+    parser.add_argument("--etapes", nargs="*", choices=ETAPES, default=ETAPES, help="étapes à lancer")
+    parser.add_argument("--workers", type=int, default=None, help="processus pour les prévisions")
+    args = parser.parse_args(argv)
+
+    executer(args.sortie, etapes=args.etapes, n_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# ================================================================
+# 🔮 MODULE PRÉVISIONS — Projection du parc de logements (toutes communes)
+# ================================================================
+# Ce module regroupe :
+# 1. Matrice communes × années du nombre de logements
+# 2. Familles de modèles vectorisées sur toutes les communes à la fois :
+#    linéaire, exponentiel (log-linéaire), tendance amortie (Holt),
+#    linéaire par morceaux (une rupture de pente)
+# 3. Backtests à origine glissante (erreurs hors échantillon par famille)
+# 4. Choix du modèle par commune, calcul par blocs dans un pool de
+#    processus, tables « previsions » et « previsions_erreurs »
+# 5. Lecture d'une commune pour l'onglet Prédictions
+# ================================================================
+# lanceur : python previsions.py --horizon 5
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_store as store
+
+
+TABLE_PREVISIONS = "previsions"
+TABLE_ERREURS = "previsions_erreurs"
+PARTITIONS_ERREURS = ["DEP"]   # une ligne par commune et famille, sans année
+
+HORIZON = 5          # années projetées au-delà de la dernière année observée
+MIN_ANNEES = 3       # en dessous, pas de prévision (comme predire_evolution_logements)
+
+# Backtest : on ajuste sur les années [0, o) et on prévoit o .. o + HORIZON_TEST - 1,
+# pour chaque origine o à partir de MIN_ENTRAINEMENT années (6 : toutes les
+# familles, y compris par morceaux, sont testées sur les mêmes années)
+HORIZON_TEST = 3
+MIN_ENTRAINEMENT = 6
+
+# Tendance amortie : lissage du niveau, de la pente et amortissement
+ALPHA, BETA, PHI = 0.8, 0.2, 0.9
+
+TAILLE_BLOC = 2000   # communes par tâche du pool
+
+
+# =================================================================
+# 🔵 1) MATRICE COMMUNES × ANNÉES
+# =================================================================
+
+def matrice_historique(df, cle="insee_com", annee="AN", valeur="LOG"):
+    """
+    Pivote une table longue en matrice (communes × années), NaN si l'année
+    manque. Retourne (codes, annees, Y).
+    """
+    large = df.pivot_table(index=cle, columns=annee, values=valeur, aggfunc="first", observed=True)
+    large = large.sort_index().sort_index(axis=1)
+    return large.index.to_numpy(), large.columns.to_numpy(dtype=int), large.to_numpy(dtype=float)
+
+
+# =================================================================
+# 🔵 2) FAMILLES DE MODÈLES
+# =================================================================
+# Chaque famille : f(x, Y, x_futur) → prévisions (communes × len(x_futur)),
+# NaN quand la famille ne s'applique pas à une commune.
+# x : années centrées (pas d'un an), Y : communes × années (NaN = manquant).
+
+def _droites(x, Y, masque):
+    """
+    Droite des moindres carrés y = a + b·x pour chaque ligne de Y, sur les
+    seuls points du masque (forme fermée, aucune boucle sur les communes).
+    """
+    w = masque.astype(float)
+    Yw = np.where(masque, Y, 0.0)
+    n = w.sum(axis=1)
+    sx = w @ x
+    sxx = w @ (x ** 2)
+    sy = Yw.sum(axis=1)
+    sxy = Yw @ x
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denominateur = n * sxx - sx ** 2
+        b = np.where(denominateur > 0, (n * sxy - sx * sy) / denominateur, 0.0)
+        a = np.where(n > 0, (sy - b * sx) / n, np.nan)
+    return a, b
+
+
+def _lineaire(x, Y, x_futur):
+    a, b = _droites(x, Y, ~np.isnan(Y))
+    return a[:, None] + b[:, None] * x_futur
+
+
+def _exponentiel(x, Y, x_futur):
+    """log(LOG) = a + b·x ; seulement si toutes les valeurs observées sont > 0."""
+    observe = ~np.isnan(Y)
+    positif = observe & (Y > 0)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        a, b = _droites(x, np.log(np.where(positif, Y, 1.0)), positif)
+        prev = np.exp(a[:, None] + b[:, None] * x_futur)
+    prev[~(positif == observe).all(axis=1)] = np.nan
+    return prev
+
+
+def _amorti(x, Y, x_futur, alpha=ALPHA, beta=BETA, phi=PHI):
+    """
+    Tendance amortie de Holt : niveau et pente mis à jour année par année
+    (boucle sur les années, vectorisée sur les communes ; une année
+    manquante prolonge la tendance), pente amortie par phi en prévision.
+    """
+    a, b = _droites(x, Y, ~np.isnan(Y))
+    # Niveau de l'année précédant la première observation : la première
+    # prévision (niveau + pente) retombe sur la droite en x[0]
+    niveau = a + b * (x[0] - 1)
+    pente = b
+    for t in range(Y.shape[1]):
+        prevu = niveau + phi * pente
+        y = Y[:, t]
+        observe = ~np.isnan(y)
+        nouveau = np.where(observe, alpha * y + (1 - alpha) * prevu, prevu)
+        pente = np.where(observe, beta * (nouveau - niveau) + (1 - beta) * phi * pente, phi * pente)
+        niveau = nouveau
+
+    pas = np.asarray(x_futur, dtype=float) - x[-1]
+    cumul = phi * (1 - phi ** pas) / (1 - phi)
+    return niveau[:, None] + pente[:, None] * cumul
+
+
+def _par_morceaux(x, Y, x_futur):
+    """
+    Linéaire par morceaux : y = a + b·x + c·max(0, x − k), rupture k choisie
+    parmi les années intérieures (au moins 3 points de part et d'autre) par
+    moindres carrés ; prévision avec la pente finale b + c.
+    """
+    observe = ~np.isnan(Y)
+    w = observe.astype(float)
+    Yw = np.where(observe, Y, 0.0)
+    n = len(Y)
+    meilleur_sse = np.full(n, np.inf)
+    prev = np.full((n, len(x_futur)), np.nan)
+
+    for k in x[2:-3]:
+        # Moindres carrés pondérés par le masque, résolus commune par commune en lot (n × 3 × 3)
+        X = np.column_stack([np.ones_like(x), x, np.maximum(0.0, x - k)])
+        G = np.einsum("nt,ti,tj->nij", w, X, X)
+        r = np.einsum("nt,ti->ni", Yw, X)
+        inversible = np.abs(np.linalg.det(G)) > 1e-9
+        coef = np.zeros((n, 3))
+        coef[inversible] = np.linalg.solve(G[inversible], r[inversible][..., None])[..., 0]
+
+        sse = (w * (Yw - coef @ X.T) ** 2).sum(axis=1)
+        mieux = inversible & (sse < meilleur_sse)
+        X_futur = np.column_stack([np.ones_like(x_futur), x_futur, np.maximum(0.0, x_futur - k)])
+        prev[mieux] = (coef @ X_futur.T)[mieux]
+        meilleur_sse[mieux] = sse[mieux]
+
+    return prev
+
+
+FAMILLES = {
+    "linéaire": _lineaire,
+    "exponentiel": _exponentiel,
+    "amorti": _amorti,
+    "par_morceaux": _par_morceaux,
+}
+
+
+# =================================================================
+# 🔵 3) BACKTESTS À ORIGINE GLISSANTE
+# =================================================================
+
+def backtester(x, Y, familles=FAMILLES, horizon_test=HORIZON_TEST, min_entrainement=MIN_ENTRAINEMENT):
+    """
+    Erreurs hors échantillon de chaque famille : pour chaque origine o,
+    ajustement sur les années [0, o) et prévision des `horizon_test`
+    suivantes. Retourne {famille: {"RMSE", "MAE", "MAPE", "N_TESTS"}}
+    (un tableau par commune, NaN si aucune prévision testée).
+    """
+    erreurs = {}
+    for nom, famille in familles.items():
+        carres = np.zeros(len(Y))
+        absolues = np.zeros(len(Y))
+        relatives = np.zeros(len(Y))
+        n_tests = np.zeros(len(Y))
+        n_relatives = np.zeros(len(Y))
+
+        for o in range(min_entrainement, Y.shape[1]):
+            fin = min(o + horizon_test, Y.shape[1])
+            reel = Y[:, o:fin]
+            prevu = famille(x[:o], Y[:, :o], x[o:fin])
+            teste = ~np.isnan(reel) & np.isfinite(prevu)
+            ecart = np.where(teste, prevu - reel, 0.0)
+            carres += (ecart ** 2).sum(axis=1)
+            absolues += np.abs(ecart).sum(axis=1)
+            n_tests += teste.sum(axis=1)
+            relatif = teste & (reel > 0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                relatives += np.where(relatif, np.abs(ecart) / reel, 0.0).sum(axis=1)
+            n_relatives += relatif.sum(axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            erreurs[nom] = {
+                "RMSE": np.sqrt(carres / n_tests),
+                "MAE": absolues / n_tests,
+                "MAPE": relatives / n_relatives * 100,
+                "N_TESTS": n_tests,
+            }
+    return erreurs
+
+
+# =================================================================
+# 🔵 4) PRÉVISIONS DE TOUTES LES COMMUNES
+# =================================================================
+
+def _evaluer_bloc(annees, Y, horizon, noms_familles):
+    """
+    Tâche d'un worker : backtests de chaque famille, choix de la famille de
+    plus faible RMSE de backtest, puis prévision sur tout l'historique.
+    """
+    familles = {nom: FAMILLES[nom] for nom in noms_familles}
+    t0 = annees.mean()
+    x = annees - t0
+    x_futur = np.arange(annees.max() + 1, annees.max() + horizon + 1) - t0
+
+    erreurs = backtester(x, Y, familles)
+    rmse = np.column_stack([erreurs[nom]["RMSE"] for nom in noms_familles])
+    prevs = np.stack([familles[nom](x, Y, x_futur) for nom in noms_familles], axis=1)
+
+    # Famille retenue : meilleur backtest parmi celles qui donnent une prévision finie
+    utilisable = np.isfinite(prevs).all(axis=2)
+    rmse = np.where(utilisable & np.isfinite(rmse), rmse, np.inf)
+    choix = np.argmin(rmse, axis=1)
+    # Sans backtest possible (historique trop court) : linéaire
+    choix[~np.isfinite(rmse).any(axis=1)] = 0
+
+    projection = prevs[np.arange(len(Y)), choix]
+    return choix, projection, erreurs
+
+
+def prevoir(df, horizon=HORIZON, familles=tuple(FAMILLES), n_workers=None,
+            taille_bloc=TAILLE_BLOC, cle="insee_com"):
+    """
+    Prévisions de toutes les communes de `df` (colonnes cle, DEP, AN, LOG).
+    Les communes sont traitées par blocs de `taille_bloc`, en parallèle
+    dans un pool de n_workers processus (None = nombre de cœurs, 1 = en série).
+    Retourne (previsions, erreurs) :
+    - previsions : une ligne par commune et année projetée
+      (insee_com, DEP, AN, LOG_PREVU, MODELE, RMSE, MAPE, LOG_DERNIER, AN_DERNIER),
+      RMSE / MAPE étant les erreurs de backtest du modèle retenu ;
+    - erreurs : une ligne par commune et famille (RMSE, MAE, MAPE, N_TESTS, RETENU).
+    Les communes avec moins de MIN_ANNEES années observées sont écartées.
+    """
+    familles = list(familles)
+    codes, annees, Y = matrice_historique(df, cle=cle)
+    observe = ~np.isnan(Y)
+    gardees = observe.sum(axis=1) >= MIN_ANNEES
+    codes, Y, observe = codes[gardees], Y[gardees], observe[gardees]
+
+    blocs = [slice(debut, debut + taille_bloc) for debut in range(0, len(Y), taille_bloc)]
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(blocs), 1))
+    if n_workers <= 1:
+        resultats = [_evaluer_bloc(annees, Y[bloc], horizon, familles) for bloc in blocs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            resultats = list(pool.map(
+                _evaluer_bloc, [annees] * len(blocs), [Y[bloc] for bloc in blocs],
+                [horizon] * len(blocs), [familles] * len(blocs),
+            ))
+
+    choix = np.concatenate([r[0] for r in resultats]) if resultats else np.zeros(0, dtype=int)
+    projection = np.concatenate([r[1] for r in resultats]) if resultats else np.zeros((0, horizon))
+    erreurs = {
+        nom: {m: np.concatenate([r[2][nom][m] for r in resultats]) for m in ["RMSE", "MAE", "MAPE", "N_TESTS"]}
+        for nom in familles
+    } if resultats else {nom: {m: np.zeros(0) for m in ["RMSE", "MAE", "MAPE", "N_TESTS"]} for nom in familles}
+
+    # Dernière valeur observée de chaque commune
+    derniere = observe.shape[1] - 1 - np.argmax(observe[:, ::-1], axis=1)
+    log_dernier = Y[np.arange(len(Y)), derniere]
+    deps = df.drop_duplicates(cle).set_index(cle)["DEP"].astype(str).reindex(codes).to_numpy()
+
+    annees_futures = np.arange(annees.max() + 1, annees.max() + horizon + 1)
+    rangs = np.arange(len(Y))
+    noms = np.array(familles, dtype=object)
+
+    def repeter(valeurs):
+        return np.repeat(np.asarray(valeurs), horizon)
+
+    def erreur_retenue(metrique):
+        return np.column_stack([erreurs[nom][metrique] for nom in familles])[rangs, choix]
+
+    previsions = pd.DataFrame({
+        cle: repeter(codes),
+        "DEP": repeter(deps),
+        "AN": np.tile(annees_futures, len(Y)),
+        "LOG_PREVU": projection.ravel(),
+        "MODELE": repeter(noms[choix]),
+        "RMSE": repeter(erreur_retenue("RMSE")),
+        "MAPE": repeter(erreur_retenue("MAPE")),
+        "LOG_DERNIER": repeter(log_dernier),
+        "AN_DERNIER": repeter(annees[derniere]),
+    })
+
+    erreurs_long = pd.DataFrame({
+        cle: np.tile(codes, len(familles)),
+        "DEP": np.tile(deps, len(familles)),
+        "MODELE": np.repeat(noms, len(Y)),
+        **{m: np.concatenate([erreurs[nom][m] for nom in familles]) for m in ["RMSE", "MAE", "MAPE", "N_TESTS"]},
+        "RETENU": np.concatenate([choix == i for i in range(len(familles))]),
+    }).sort_values([cle, "MODELE"], kind="stable", ignore_index=True)
+
+    return previsions, erreurs_long
+
+
+def executer(racine=store.RACINE_PARQUET, horizon=HORIZON, n_workers=None):
+    """Calcule prévisions et erreurs depuis la table communes et les écrit dans le dataset."""
+    debut = time.perf_counter()
+    historique = store.lire_table(store.TABLE_COMMUNES, colonnes=["insee_com", "DEP", "AN", "LOG"], racine=racine)
+    previsions, erreurs = prevoir(historique, horizon, n_workers=n_workers)
+    store.ecrire_table(previsions, TABLE_PREVISIONS, racine=racine)
+    store.ecrire_table(erreurs, TABLE_ERREURS, racine=racine, partitions=PARTITIONS_ERREURS)
+
+    retenus = erreurs.loc[erreurs["RETENU"], "MODELE"].value_counts().to_dict()
+    print(f"{previsions['insee_com'].nunique()} communes projetées sur {horizon} ans "
+          f"en {time.perf_counter() - debut:.1f} s → {racine}/{TABLE_PREVISIONS} (modèles : {retenus})")
+    return previsions, erreurs
+
+
+# =================================================================
+# 🔵 5) LECTURE POUR UNE COMMUNE
+# =================================================================
+
+def serie_commune(historique, previsions_commune, annees_futures=3):
+    """
+    Assemble l'historique (colonnes AN, LOG) et les `annees_futures`
+    premières années projetées d'une commune au format de
+    predire_evolution_logements : (DataFrame Année / Logements / Type,
+    croissance annuelle en %). (None, None) sans prévision.
+    """
+    prev = previsions_commune.sort_values("AN").head(annees_futures)
+    if prev.empty:
+        return None, None
+
+    df_hist = pd.DataFrame({
+        "Année": historique["AN"].to_numpy(dtype=int),
+        "Logements": historique["LOG"].to_numpy(dtype=float),
+        "Type": "Historique",
+    }).sort_values("Année")
+
+    df_pred = pd.DataFrame({
+        "Année": prev["AN"].to_numpy(dtype=int),
+        "Logements": prev["LOG_PREVU"].to_numpy(dtype=float),
+        "Type": "Prédiction",
+    })
+
+    dernier = float(prev["LOG_DERNIER"].iloc[0])
+    croissance = ((df_pred["Logements"].iloc[-1] - dernier) / dernier) * 100 / len(df_pred)
+
+    return pd.concat([df_hist, df_pred], ignore_index=True), croissance
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prévisions du parc de logements pour toutes les communes.")
+    parser.add_argument("--sortie", default=store.RACINE_PARQUET, help="racine du dataset Parquet")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="nombre d'années projetées")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processus en parallèle (défaut : nombre de cœurs)")
+    args = parser.parse_args(argv)
+
+    executer(args.sortie, args.horizon, args.workers)
+
+
+if __name__ == "__main__":
+    main()